@@ -1,29 +1,35 @@
 """MCP Tool Wrappers for BNPL Analytics Agent."""
 
-from .mcp_client import MCPClient, get_mcp_client, MCPResponse
-from .schema_tool import SchemaTool
+from .mcp_client import MCPClient, get_mcp_client, resilient_call, MCPResponse
+from .schema_tool import SchemaTool, get_schema_tool
 from .kpi_tool import KPITool, KPI_CATALOG
 from .sql_tool import SQLTool
-from .risk_tool import RiskTool
+from .risk_tool import RiskTool, get_risk_tool
 from .trace_tool import TraceTool
 from .local_data import LocalDataAdapter, get_local_data
 from .ml_tool import MLPredictionTool, get_ml_tool
 from .csv_tool import CSVTool
+from ._loop import run_tools, run_tools_sync
 
 __all__ = [
     "MCPClient",
     "get_mcp_client", 
     "MCPResponse",
+    "resilient_call",
     "SchemaTool",
+    "get_schema_tool",
     "KPITool",
     "KPI_CATALOG",
     "SQLTool",
     "RiskTool",
+    "get_risk_tool",
     "TraceTool",
     "LocalDataAdapter",
     "get_local_data",
     "MLPredictionTool",
     "get_ml_tool",
     "CSVTool",
+    "run_tools",
+    "run_tools_sync",
 ]
 
@@ -0,0 +1,88 @@
+"""
+Background event loop for running tool coroutines from synchronous code.
+
+Tools implement their logic in async `_arun`; their sync `_run` used to wrap
+it in `asyncio.run`, which builds and tears down an event loop per call and
+strands the MCP client's pooled connections on the dead loop. Instead, sync
+calls are handed to one long-lived loop on a daemon thread, so connections
+opened by earlier calls are reused.
+"""
+
+import asyncio
+import concurrent.futures
+import threading
+from typing import Any, Coroutine, List, Optional
+
+
+class AsyncLoopThread(threading.Thread):
+    """Daemon thread running one event loop for the life of the process."""
+
+    def __init__(self):
+        super().__init__(name="tool-event-loop", daemon=True)
+        # Created up front so coroutines can be submitted before run() starts
+        self.loop = asyncio.new_event_loop()
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro: Coroutine) -> concurrent.futures.Future:
+        """Schedule a coroutine on the loop from any thread."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+
+_loop_thread: Optional[AsyncLoopThread] = None
+_loop_lock = threading.Lock()
+
+
+def _get_loop_thread() -> AsyncLoopThread:
+    """Get the shared loop thread, starting it on first use."""
+    global _loop_thread
+    if _loop_thread is None:
+        with _loop_lock:
+            if _loop_thread is None:
+                thread = AsyncLoopThread()
+                thread.start()
+                _loop_thread = thread
+    return _loop_thread
+
+
+def run_sync(coro: Coroutine) -> Any:
+    """
+    Run a coroutine to completion from synchronous code.
+
+    Like asyncio.run, this refuses to block a running event loop - async
+    callers should use the tool's async interface (ainvoke / _arun).
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return _get_loop_thread().submit(coro).result()
+
+    coro.close()
+    raise RuntimeError(
+        "Synchronous tool call from a running event loop; use ainvoke() instead"
+    )
+
+
+async def run_tools(*coros: Coroutine) -> List[Any]:
+    """
+    Run several tool coroutines concurrently, e.g. schema + risk + SQL.
+
+    Their MCP round trips overlap on the shared client, so the step takes
+    as long as the slowest call instead of their sum. Results come back in
+    argument order.
+    """
+    return await asyncio.gather(*coros)
+
+
+def run_tools_sync(*coros: Coroutine) -> List[Any]:
+    """Synchronous run_tools, on the shared background loop."""
+    try:
+        return run_sync(run_tools(*coros))
+    except RuntimeError:
+        # Refused inside a running loop - don't leave the tool calls unawaited
+        for coro in coros:
+            coro.close()
+        raise
+
@@ -5,14 +5,118 @@ Replaces the need for SQL emulation by allowing the agent to
 operate directly on DataFrames using structured filter logic.
 """
 
+import base64
+import io
 import json
+import operator
+import numpy as np
 import pandas as pd
-from typing import Optional, List, Dict, Any, Union
+from typing import Optional, List, Dict, Any, Union, Literal
 from langchain_core.tools import BaseTool
 from pydantic import BaseModel, Field
 
 from .local_data import get_local_data
 
+try:
+    import orjson
+except ImportError:  # Optional - falls back to the stdlib json module
+    orjson = None
+
+# Comparison filters, dispatched by op string
+_OPS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+}
+
+# Numeric comparisons fused into a single df.eval pass once there are this many
+_FUSE_MIN_FILTERS = 3
+
+
+def _is_numeric_filter(df: pd.DataFrame, f: Dict[str, Any]) -> bool:
+    """Whether a filter compares a numeric column against a numeric scalar."""
+    col, op, val = f.get("col"), f.get("op", "=="), f.get("val")
+    return (
+        op in _OPS
+        and col in df.columns
+        and pd.api.types.is_numeric_dtype(df[col])
+        and not pd.api.types.is_bool_dtype(df[col])
+        and isinstance(val, (int, float))
+        and not isinstance(val, bool)
+    )
+
+
+def _eval_numeric_filters(df: pd.DataFrame, filters: List[Dict[str, Any]]) -> np.ndarray:
+    """
+    Evaluate an AND-chain of numeric comparisons as one expression.
+    
+    df.eval hands the whole expression to numexpr when it is installed,
+    which evaluates it in cache-sized blocks without materializing one
+    temporary mask per condition.
+    """
+    terms = []
+    values = {}
+    for i, f in enumerate(filters):
+        terms.append(f"(`{f['col']}` {f.get('op', '==')} @v{i})")
+        values[f"v{i}"] = f["val"]
+    return df.eval(" & ".join(terms), local_dict=values).to_numpy(dtype=bool)
+
+
+def _sort_positions(values: np.ndarray, idx: np.ndarray, ascending: bool) -> np.ndarray:
+    """Order row positions by `values`, missing values last (like sort_values)."""
+    subset = values[idx]
+    missing = pd.isna(subset)
+    present = idx[~missing]
+    keys = subset[~missing]
+    if ascending:
+        order = np.argsort(keys, kind="stable")
+    else:
+        # Stable descending: ties keep their row order
+        order = len(keys) - 1 - np.argsort(keys[::-1], kind="stable")[::-1]
+    return np.concatenate([present[order], idx[missing]])
+
+
+def _render_markdown(df: pd.DataFrame) -> str:
+    """
+    Render a DataFrame as a compact markdown table.
+    
+    Cells are not padded to a common width - the output goes to an LLM,
+    which does not need alignment, and the shorter rows save tokens.
+    """
+    buf = io.StringIO()
+    buf.write("|" + "|".join(str(c) for c in df.columns) + "|\n")
+    buf.write("|" + "|".join("---" for _ in df.columns) + "|\n")
+    for row in df.itertuples(index=False, name=None):
+        buf.write("|" + "|".join(str(v) for v in row) + "|\n")
+    return buf.getvalue()
+
+
+def _render_arrow_b64(df: pd.DataFrame) -> str:
+    """
+    Serialize a DataFrame as a base64-encoded Arrow IPC stream.
+    
+    For tool-to-tool handoffs: no per-cell string formatting, and dtypes
+    survive the trip. Decode with read_arrow_b64().
+    """
+    import pyarrow as pa
+    
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return base64.b64encode(sink.getvalue().to_pybytes()).decode("ascii")
+
+
+def read_arrow_b64(payload: str) -> pd.DataFrame:
+    """Decode a CSVTool "arrow_b64" result back into a DataFrame."""
+    import pyarrow as pa
+    
+    with pa.ipc.open_stream(base64.b64decode(payload)) as reader:
+        return reader.read_all().to_pandas()
+
 class CSVQuery(BaseModel):
     """Structure for a CSV query."""
     table: str = Field(description="Name of the table (csv file) to query")
@@ -21,6 +125,10 @@ class CSVQuery(BaseModel):
     sort_by: Optional[str] = Field(default=None, description="Column to sort by")
     ascending: bool = Field(default=False, description="Sort direction")
     limit: int = Field(default=50, description="Max rows to return")
+    format: Literal["markdown", "arrow_b64"] = Field(
+        default="markdown",
+        description="Output format: markdown for LLMs, arrow_b64 (base64 Arrow IPC stream) for other tools",
+    )
 
 class CSVTool(BaseTool):
     """
@@ -44,7 +152,7 @@ class CSVTool(BaseTool):
             if isinstance(query_json, dict):
                 params = query_json
             else:
-                params = json.loads(query_json)
+                params = orjson.loads(query_json) if orjson is not None else json.loads(query_json)
                 
             query = CSVQuery(**params)
             
@@ -55,50 +163,58 @@ class CSVTool(BaseTool):
             if df is None:
                 return f"Error: Table '{query.table}' not found. Available: {', '.join(adapter.tables)}"
             
-            # Apply filters
-            filtered_df = df.copy()
+            # Apply filters (build one mask, then index once)
+            mask = np.ones(len(df), dtype=bool)
+            filters = query.filters
             
-            for f in query.filters:
+            numeric = [f for f in filters if _is_numeric_filter(df, f)]
+            if len(numeric) >= _FUSE_MIN_FILTERS:
+                mask &= _eval_numeric_filters(df, numeric)
+                filters = [f for f in filters if not _is_numeric_filter(df, f)]
+            
+            for f in filters:
                 col = f.get("col")
                 op = f.get("op", "==")
                 val = f.get("val")
                 
-                if col not in filtered_df.columns:
+                if col not in df.columns:
                     continue
-                    
-                if op == "==":
-                    filtered_df = filtered_df[filtered_df[col] == val]
-                elif op == "!=":
-                    filtered_df = filtered_df[filtered_df[col] != val]
-                elif op == ">":
-                    filtered_df = filtered_df[filtered_df[col] > val]
-                elif op == ">=":
-                    filtered_df = filtered_df[filtered_df[col] >= val]
-                elif op == "<":
-                    filtered_df = filtered_df[filtered_df[col] < val]
-                elif op == "<=":
-                    filtered_df = filtered_df[filtered_df[col] <= val]
+                
+                if op in _OPS:
+                    values = df[col]
+                    if op not in ("==", "!=") and isinstance(values.dtype, pd.CategoricalDtype):
+                        # Unordered categoricals (ids, city, ...) compare as text
+                        values = adapter.get_string_column(query.table, col)
+                    mask &= _OPS[op](values, val).to_numpy(dtype=bool, na_value=False)
                 elif op == "contains":
-                    filtered_df = filtered_df[filtered_df[col].astype(str).str.contains(str(val), case=False, na=False)]
+                    col_str = adapter.get_string_column(query.table, col)
+                    mask &= col_str.str.contains(str(val), case=False, na=False, regex=False).to_numpy(dtype=bool)
                 elif op == "in":
-                    filtered_df = filtered_df[filtered_df[col].isin(val if isinstance(val, list) else [val])]
+                    values = frozenset(val if isinstance(val, list) else [val])
+                    mask &= df[col].isin(values).to_numpy(dtype=bool)
+            
+            # Work on row positions - no intermediate full-width frames
+            idx = np.flatnonzero(mask)
             
             # Select columns
+            cols = list(df.columns)
             if query.columns and "*" not in query.columns:
                 # Only select existing columns
-                valid_cols = [c for c in query.columns if c in filtered_df.columns]
+                valid_cols = [c for c in query.columns if c in df.columns]
                 if valid_cols:
-                    filtered_df = filtered_df[valid_cols]
+                    cols = valid_cols
             
-            # Sort
-            if query.sort_by and query.sort_by in filtered_df.columns:
-                filtered_df = filtered_df.sort_values(by=query.sort_by, ascending=query.ascending)
+            # Sort (only the filtered subset of the sort column)
+            if query.sort_by and query.sort_by in df.columns:
+                idx = _sort_positions(df[query.sort_by].to_numpy(), idx, query.ascending)
             
-            # Limit
-            result_df = filtered_df.head(query.limit)
+            # Limit, then gather the selected rows and columns once
+            result_df = df.iloc[idx[:query.limit]][cols]
             
             # Format output
-            return f"Found {len(result_df)} rows:\n\n" + result_df.to_markdown(index=False)
+            if query.format == "arrow_b64":
+                return _render_arrow_b64(result_df)
+            return f"Found {len(result_df)} rows:\n\n" + _render_markdown(result_df)
             
         except Exception as e:
             return f"CSV Query Error: {str(e)}"
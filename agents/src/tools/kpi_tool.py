@@ -6,12 +6,19 @@ This is the PREFERRED way to get metrics (vs raw SQL).
 """
 
 import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional, List
+from typing import Optional, List, Dict, Tuple
+import numpy as np
 from pydantic import BaseModel, Field
 from langchain_core.tools import BaseTool
 
-from .mcp_client import get_mcp_client, MCPResponse
+from ._loop import run_sync
+from .mcp_client import get_mcp_client, canonical_json, resilient_call, MCPResponse
+from .local_data import ORDER_METRICS
 
 
 class KPIDefinition(BaseModel):
@@ -110,6 +117,89 @@ KPI_CATALOG = {
 }
 
 
+# Mock value ranges (low, high) used when neither MCP nor local data is available
+MOCK_VALUE_RANGES = {
+    "gmv": (1_500_000, 3_000_000),
+    "approval_rate": (0.75, 0.92),
+    "active_users": (15000, 35000),
+    "repeat_user_rate": (0.30, 0.45),
+    "late_rate": (0.03, 0.08),
+    "dispute_rate": (0.005, 0.02),
+    "refund_rate": (0.01, 0.04),
+    "checkout_conversion": (0.55, 0.75),
+    "repayment_velocity": (-2, 3),
+}
+MOCK_INTEGER_KPIS = {"active_users"}
+
+# Mock delinquency bucket counts (inclusive ranges)
+MOCK_BUCKET_LABELS = ["1-7 days", "8-30 days", "31-60 days", "60+ days"]
+_MOCK_BUCKET_LOW = np.array([500, 200, 50, 10])
+_MOCK_BUCKET_HIGH = np.array([1500, 800, 300, 100])
+
+# Set MOCK_DATA_SEED for reproducible mock data (e.g. in tests)
+_mock_seed = os.getenv("MOCK_DATA_SEED")
+_RNG = np.random.default_rng(int(_mock_seed) if _mock_seed else None)
+
+
+# Successful kpi.get responses, keyed by canonical params JSON (LRU), with
+# their expiry time (monotonic seconds): windows ending today keep moving
+# as new orders land, so answers are reused for a few minutes only
+_KPI_CACHE_SIZE = 128
+_KPI_CACHE_TTL = 300.0
+_kpi_cache: "OrderedDict[bytes, Tuple[float, MCPResponse]]" = OrderedDict()
+# In-flight kpi.get calls, so concurrent identical requests share one call
+_kpi_inflight: Dict[bytes, asyncio.Task] = {}
+# Sync calls run on the background loop while async callers may bring their
+# own loops (threads), so both dicts are only touched under this lock
+_kpi_lock = threading.Lock()
+
+
+def _forget_inflight(key: bytes, task: asyncio.Task) -> None:
+    """Drop a finished call, unless a newer one has replaced it."""
+    with _kpi_lock:
+        if _kpi_inflight.get(key) is task:
+            del _kpi_inflight[key]
+
+
+async def _cached_kpi_call(client, params: dict) -> MCPResponse:
+    """Call kpi.get through the response cache."""
+    try:
+        key = canonical_json(params)
+    except TypeError:
+        # Unserializable filters can't be keyed - let the call report the
+        # error so the tool's fallback still applies
+        return await resilient_call(client, "kpi.get", params)
+    
+    with _kpi_lock:
+        cached = _kpi_cache.get(key)
+        if cached is not None:
+            expires_at, response = cached
+            if time.monotonic() < expires_at:
+                _kpi_cache.move_to_end(key)
+                return response
+            del _kpi_cache[key]
+        
+        # Tasks are bound to their event loop - only join one from this loop
+        task = _kpi_inflight.get(key)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.ensure_future(resilient_call(client, "kpi.get", params))
+            _kpi_inflight[key] = task
+            task.add_done_callback(lambda t: _forget_inflight(key, t))
+    
+    # Shielded: one cancelled caller must not cancel the call for the others
+    response = await asyncio.shield(task)
+    
+    # Only successes are cached, so an unavailable server is retried
+    if response.success and response.data:
+        with _kpi_lock:
+            _kpi_cache[key] = (time.monotonic() + _KPI_CACHE_TTL, response)
+            _kpi_cache.move_to_end(key)
+            if len(_kpi_cache) > _KPI_CACHE_SIZE:
+                _kpi_cache.popitem(last=False)
+    
+    return response
+
+
 class KPITool(BaseTool):
     """
     LangChain tool for fetching pre-computed KPIs via MCP.
@@ -161,7 +251,7 @@ class KPITool(BaseTool):
         filters: Optional[dict] = None,
     ) -> str:
         """Synchronous KPI fetch."""
-        return asyncio.run(self._arun(kpi_name, start_date, end_date, group_by, filters))
+        return run_sync(self._arun(kpi_name, start_date, end_date, group_by, filters))
     
     async def _arun(
         self,
@@ -202,7 +292,7 @@ class KPITool(BaseTool):
         if filters:
             params["filters"] = filters
         
-        response: MCPResponse = await client.call("kpi.get", params)
+        response: MCPResponse = await _cached_kpi_call(client, params)
         
         if response.success and response.data:
             return self._format_result(kpi_name, response.data, start_date, end_date)
@@ -298,26 +388,30 @@ class KPITool(BaseTool):
     ) -> dict:
         """Calculate KPI from local CSV data."""
         
+        if kpi_name in ORDER_METRICS:
+            # One pass over the window yields all order KPIs; the bundle is
+            # memoized, so follow-up KPIs for the same window are lookups
+            result = local_data.calculate_metrics_bundle(start_date, end_date)[kpi_name]
+        
         if kpi_name == "gmv":
-            result = local_data.calculate_gmv(start_date, end_date)
             if group_by and "merchant_id" in group_by:
                 top_merchants = local_data.get_top_merchants("gmv", 5)
                 if not top_merchants.empty:
+                    name_col = "merchant_name" if "merchant_name" in top_merchants.columns else "merchant_id"
                     result["breakdown"] = [
-                        {"dimension_value": row.get("merchant_name", row.get("merchant_id")), 
-                         "value": row["gmv"]}
-                        for _, row in top_merchants.iterrows()
+                        {"dimension_value": name, "value": gmv}
+                        for name, gmv in zip(top_merchants[name_col].tolist(), top_merchants["gmv"].tolist())
                     ]
             return result
         
         elif kpi_name == "approval_rate":
-            return local_data.calculate_approval_rate(start_date, end_date)
+            return result
         
         elif kpi_name == "late_rate":
             return local_data.calculate_late_rate(start_date, end_date)
         
         elif kpi_name == "active_users":
-            return local_data.calculate_active_users(start_date, end_date)
+            return result
         
         elif kpi_name == "delinquency_buckets":
             buckets = local_data.get_delinquency_buckets()
@@ -325,8 +419,8 @@ class KPITool(BaseTool):
                 return {
                     "value": "See breakdown",
                     "breakdown": [
-                        {"dimension_value": row["bucket"], "value": row["count"]}
-                        for _, row in buckets.iterrows()
+                        {"dimension_value": bucket, "value": count}
+                        for bucket, count in zip(buckets["bucket"].tolist(), buckets["count"].tolist())
                     ]
                 }
             return {"value": "No late installments found"}
@@ -341,36 +435,30 @@ class KPITool(BaseTool):
         group_by: Optional[List[str]] = None
     ) -> dict:
         """Generate mock data for demo/testing."""
-        import random
-        
-        mock_values = {
-            "gmv": {"value": random.uniform(1_500_000, 3_000_000)},
-            "approval_rate": {"value": random.uniform(0.75, 0.92)},
-            "active_users": {"value": random.randint(15000, 35000)},
-            "repeat_user_rate": {"value": random.uniform(0.30, 0.45)},
-            "late_rate": {"value": random.uniform(0.03, 0.08)},
-            "dispute_rate": {"value": random.uniform(0.005, 0.02)},
-            "refund_rate": {"value": random.uniform(0.01, 0.04)},
-            "checkout_conversion": {"value": random.uniform(0.55, 0.75)},
-            "repayment_velocity": {"value": random.uniform(-2, 3)},
-            "delinquency_buckets": {
+        if kpi_name == "delinquency_buckets":
+            counts = _RNG.integers(_MOCK_BUCKET_LOW, _MOCK_BUCKET_HIGH, endpoint=True)
+            result = {
                 "value": "See breakdown",
                 "breakdown": [
-                    {"dimension_value": "1-7 days", "value": random.randint(500, 1500)},
-                    {"dimension_value": "8-30 days", "value": random.randint(200, 800)},
-                    {"dimension_value": "31-60 days", "value": random.randint(50, 300)},
-                    {"dimension_value": "60+ days", "value": random.randint(10, 100)},
+                    {"dimension_value": label, "value": int(count)}
+                    for label, count in zip(MOCK_BUCKET_LABELS, counts)
                 ]
-            },
-        }
-        
-        result = mock_values.get(kpi_name, {"value": 0})
+            }
+        elif kpi_name in MOCK_VALUE_RANGES:
+            low, high = MOCK_VALUE_RANGES[kpi_name]
+            if kpi_name in MOCK_INTEGER_KPIS:
+                result = {"value": int(_RNG.integers(low, high, endpoint=True))}
+            else:
+                result = {"value": float(_RNG.uniform(low, high))}
+        else:
+            result = {"value": 0}
         
         # Add mock breakdown if group_by requested
         if group_by and "breakdown" not in result:
+            shares = _RNG.uniform(0.1, 0.5, size=5) * result.get("value", 1000)
             result["breakdown"] = [
-                {"dimension_value": f"Group_{i+1}", "value": random.uniform(0.1, 0.5) * result.get("value", 1000)}
-                for i in range(5)
+                {"dimension_value": f"Group_{i+1}", "value": float(share)}
+                for i, share in enumerate(shares)
             ]
         
         return result
@@ -1,15 +1,203 @@
 """
 Local Data Adapter - Query the CSV files in /data/silver/ directly.
 
+Parquet copies of the same tables (pipelines/silver_to_parquet.py)
+are picked up in place of the CSVs when present.
+
 This adapter allows the agent to work with local CSV data
 without needing an external MCP server or database.
 """
 
+import hashlib
 import os
+import threading
+from datetime import date
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
+import numpy as np
 import pandas as pd
 
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # Optional - falls back to the pandas C parser
+    pa = pa_csv = None
+
+# Copy-on-Write: filtered/projected views share buffers with the cached
+# tables until written to. Always on (and the option deprecated) in pandas 3.
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+# Date columns parsed to datetime64 at load (and indexed for range filters)
+DATE_COLUMNS = ["created_at", "due_date", "paid_date"]
+
+# Silver dates are ISO 8601 - naming the format keeps pandas on its C parser
+# instead of inferring a format (or falling back to dateutil)
+DATE_FORMAT = "ISO8601"
+
+
+# Delinquency buckets by late_days: <=0, 1-7, 8-30, 31-60, 60+
+DELINQUENCY_BUCKETS = ["Not Late", "1-7 days", "8-30 days", "31-60 days", "60+ days"]
+
+
+def _bucket_histogram(days: np.ndarray) -> np.ndarray:
+    """Count late_days values per delinquency bucket in a single pass."""
+    # Branch-free bucket index; NaN compares False everywhere -> "Not Late"
+    bucket = (days > 0).astype(np.intp) + (days > 7) + (days > 30) + (days > 60)
+    return np.bincount(bucket, minlength=len(DELINQUENCY_BUCKETS))
+
+
+# Id / dimension columns stored as categoricals shared across tables
+KEY_COLUMNS = ["merchant_id", "user_id", "category", "city"]
+
+# Low-cardinality label columns stored as per-table categoricals, so
+# equality filters compare small integer codes instead of strings
+LABEL_COLUMNS = [
+    "status", "currency", "event_type", "payment_channel", "reason",
+    "merchant_status", "account_status", "kyc_level",
+]
+
+# Tables whose contents feed the user ML scores
+SCORE_INPUT_TABLES = ["users", "orders", "installments", "disputes"]
+
+# Order-window metrics calculate_metrics_bundle can derive in one pass
+ORDER_METRICS = ("gmv", "approval_rate", "active_users")
+
+# Memoized (start_date, end_date, metrics) bundles - the tables never change
+_METRICS_CACHE_SIZE = 64
+
+# Rows sampled with pandas to decide which CSV columns are text
+_CSV_SAMPLE_ROWS = 1000
+
+
+def _read_csv(path: Path, date_cols: List[str]) -> pd.DataFrame:
+    """Read a CSV with pyarrow's multithreaded parser when it is installed."""
+    if pa_csv is None:
+        return pd.read_csv(path, parse_dates=date_cols, date_format=DATE_FORMAT)
+    
+    # Pin columns pandas reads as text to strings, so arrow does not turn
+    # date-like text (order_date, ...) into date objects, and pin the date
+    # columns to timestamps
+    sample = pd.read_csv(path, nrows=_CSV_SAMPLE_ROWS)
+    column_types = {
+        c: pa.string()
+        for c in sample.columns
+        if c not in date_cols and not pd.api.types.is_numeric_dtype(sample[c])
+    }
+    column_types.update({c: pa.timestamp("ns") for c in date_cols})
+    
+    try:
+        table = pa_csv.read_csv(
+            path,
+            read_options=pa_csv.ReadOptions(use_threads=True),
+            convert_options=pa_csv.ConvertOptions(
+                column_types=column_types,
+                strings_can_be_null=True,
+            ),
+        )
+    except pa.ArrowInvalid:
+        # Sample was not representative (e.g. text further down a numeric column)
+        return pd.read_csv(path, parse_dates=date_cols, date_format=DATE_FORMAT)
+    
+    # One block per column, releasing each arrow buffer once converted, so
+    # peak memory is about one copy of the table instead of two
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def _codes(values: pd.Series) -> Tuple[np.ndarray, Any]:
+    """Integer codes (-1 for missing) and the distinct values they index."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # Already encoded at load - no hashing needed
+        codes = values.cat.codes.to_numpy()
+        return codes, pd.Categorical.from_codes(np.arange(len(values.cat.categories)), dtype=values.dtype)
+    return pd.factorize(values)
+
+
+def _sum_by_key(keys: pd.Series, weights: Dict[str, np.ndarray]) -> pd.DataFrame:
+    """
+    Sum each weight column per key with np.bincount - no hash table, no sort.
+    
+    Returns one row per key that occurs, like groupby(observed=True).sum().
+    """
+    key_codes, key_values = _codes(keys)
+    present = key_codes >= 0
+    codes = key_codes[present]
+    size = len(key_values)
+    
+    result = pd.DataFrame({keys.name: key_values})
+    for name, values in weights.items():
+        result[name] = np.bincount(codes, weights=values[present], minlength=size)
+    return result[np.bincount(codes, minlength=size) > 0].reset_index(drop=True)
+
+
+def _align_to(stats: pd.DataFrame, keys: pd.Series, names: List[str]) -> Dict[str, np.ndarray]:
+    """
+    Columns of a one-row-per-key stats frame, reordered to match `keys`.
+    
+    One indexer lookup instead of a merge; keys without stats get 0.
+    """
+    if stats.empty:
+        return {name: np.zeros(len(keys)) for name in names}
+    positions = pd.Index(stats[keys.name]).get_indexer(keys)
+    found = positions >= 0
+    return {name: np.where(found, stats[name].to_numpy()[positions], 0) for name in names}
+
+
+def _count_by_status(keys: pd.Series, status: pd.Series) -> pd.DataFrame:
+    """
+    Count rows per key and status in a single np.bincount pass.
+    
+    Returns one row per key that occurs, a count column per status value
+    and a "_rows" column with every row of the key (missing status included).
+    """
+    key_codes, key_values = _codes(keys)
+    status_codes, status_values = _codes(status)
+    
+    # (key, status) pairs flattened to one index; the last status slot
+    # collects rows with a missing status
+    width = len(status_values) + 1
+    status_codes = np.where(status_codes >= 0, status_codes, width - 1)
+    present = key_codes >= 0
+    counts = np.bincount(
+        key_codes[present].astype(np.int64) * width + status_codes[present],
+        minlength=len(key_values) * width,
+    ).reshape(len(key_values), width)
+    
+    result = pd.DataFrame(counts[:, :-1], columns=[str(v) for v in status_values])
+    result["_rows"] = counts.sum(axis=1)
+    result.insert(0, keys.name, key_values)
+    return result[result["_rows"] > 0].reset_index(drop=True)
+
+
+def _date_bounds(
+    values: np.ndarray,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+) -> Tuple[int, int]:
+    """Slice bounds of [start_date, end_date] in a sorted int64 date array."""
+    # NaT sorts first as the smallest int64 - never part of a range
+    lo = int(np.searchsorted(values, np.iinfo(np.int64).min, side="right"))
+    hi = len(values)
+    if start_date:
+        lo = max(lo, int(np.searchsorted(values, pd.Timestamp(start_date).value, side="left")))
+    if end_date:
+        hi = int(np.searchsorted(values, pd.Timestamp(end_date).value, side="right"))
+    return lo, max(lo, hi)
+
+
+def _text_date_mask(
+    values: pd.Series,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+) -> np.ndarray:
+    """Mask of [start_date, end_date] for a date column left as text (compared as strings)."""
+    mask = np.ones(len(values), dtype=bool)
+    if start_date:
+        mask &= (values >= start_date).to_numpy(dtype=bool, na_value=False)
+    if end_date:
+        mask &= (values <= end_date).to_numpy(dtype=bool, na_value=False)
+    return mask
+
 
 class LocalDataAdapter:
     """
@@ -27,37 +215,269 @@ class LocalDataAdapter:
             # Default: look for ../data/silver relative to agents/
             self.data_path = Path(__file__).parent.parent.parent.parent / "data" / "silver"
         
+        # table -> source file; tables are read on first access
+        self._table_paths: Dict[str, Path] = {}
+        # Only fully indexed tables are published here, so get_table can
+        # read it without the lock
         self._dataframes: Dict[str, pd.DataFrame] = {}
+        # Tables being read and indexed (under the lock), not yet published
+        self._building: Dict[str, pd.DataFrame] = {}
+        self._load_lock = threading.RLock()
+        self._string_columns: Dict[Tuple[str, str], pd.Series] = {}
+        # table -> user_id -> row positions of that user, built on first lookup
+        self._user_index: Dict[str, Dict[Any, np.ndarray]] = {}
+        # key column -> categorical dtype shared by every loaded table
+        self._key_dtypes: Dict[str, pd.CategoricalDtype] = {}
+        # (table, column) -> (sorted int64 dates, row positions in that order)
+        self._date_index: Dict[Tuple[str, str], Tuple[np.ndarray, np.ndarray]] = {}
+        # table -> status value -> row positions with that status
+        self._status_index: Dict[str, Dict[str, np.ndarray]] = {}
+        # table -> (int8 status codes, -1 if missing; status names by code)
+        self._status_codes: Dict[str, Tuple[np.ndarray, Tuple[str, ...]]] = {}
+        # Approved orders (sorted by created_at) and their merchant grouping
+        self._approved_orders: Optional[pd.DataFrame] = None
+        self._approved_dates: Optional[np.ndarray] = None
+        self._orders_by_merchant = None
+        self._metrics_cache: Dict[Tuple, Dict[str, Dict[str, Any]]] = {}
         self._load_data()
     
     def _load_data(self):
-        """Load all CSV files into memory."""
+        """Discover the silver tables (Parquet or CSV); they load on first use."""
         if not self.data_path.exists():
             print(f"Warning: Data path not found: {self.data_path}")
             return
         
-        csv_files = list(self.data_path.glob("*.csv"))
+        # Parquet copies (see pipelines/silver_to_parquet.py) take precedence
+        self._table_paths = {f.stem: f for f in self.data_path.glob("*.csv")}
+        self._table_paths.update({f.stem: f for f in self.data_path.glob("*.parquet")})
+    
+    def _load_table(self, table_name: str) -> Optional[pd.DataFrame]:
+        """Read one table into memory and build its indexes."""
+        path = self._table_paths[table_name]
+        try:
+            df = self._read_table(path)
+        except Exception as e:
+            print(f"Error loading {path}: {e}")
+            # Unreadable tables are dropped, as if they were never there
+            del self._table_paths[table_name]
+            return None
         
-        for csv_file in csv_files:
-            table_name = csv_file.stem  # filename without extension
-            try:
-                df = pd.read_csv(csv_file)
-                self._dataframes[table_name] = df
-                print(f"Loaded: {table_name} ({len(df)} rows)")
-            except Exception as e:
-                print(f"Error loading {csv_file}: {e}")
-                
-        # --- Batch Score Users for SQL Queries ---
-        if "users" in self._dataframes:
-            try:
-                self._enrich_users_with_scores()
-            except Exception as e:
-                print(f"Error enriching users with scores: {e}")
+        if table_name == "orders" and pd.api.types.is_datetime64_any_dtype(df.get("created_at")):
+            df = df.sort_values("created_at", kind="stable", na_position="first", ignore_index=True)
+        
+        # Indexes are built on the unpublished frame, so other threads never
+        # see a half-built table
+        self._building[table_name] = df
+        try:
+            self._index_dates(table_name, df)
+            self._index_status(table_name, df)
+            self._encode_keys(table_name, df)
+            print(f"Loaded: {table_name} ({len(df)} rows)")
+            
+            if table_name == "orders":
+                self._index_orders(df)
+            
+            # --- Batch Score Users for SQL Queries ---
+            if table_name == "users":
+                try:
+                    self._enrich_users_with_scores(df)
+                except Exception as e:
+                    print(f"Error enriching users with scores: {e}")
+        finally:
+            del self._building[table_name]
+        
+        self._dataframes[table_name] = df
+        return df
 
-    def _enrich_users_with_scores(self):
+    def _read_table(self, path: Path) -> pd.DataFrame:
+        """Read one silver table from Parquet or CSV."""
+        if path.suffix == ".parquet":
+            # Typed columnar file - no text parsing, dates already datetime64
+            return pd.read_parquet(path)
+        
+        header = pd.read_csv(path, nrows=0).columns
+        date_cols = [c for c in DATE_COLUMNS if c in header]
+        return _read_csv(path, date_cols)
+    
+    def _encode_keys(self, table_name: str, df: pd.DataFrame):
+        """
+        Store a table's key columns as categoricals shared across tables.
+        
+        Groupbys then work on the integer codes instead of hashing strings,
+        and because every loaded table uses the same categories per column,
+        joins such as orders -> merchants keep the categorical dtype. When a
+        table brings new values, the category set grows and the tables
+        loaded earlier are recoded to it.
+        """
+        for col in KEY_COLUMNS:
+            # Numeric ids already group without hashing strings
+            if col not in df.columns or pd.api.types.is_numeric_dtype(df[col]):
+                continue
+            dtype = self._key_dtypes.get(col)
+            values = pd.Index(df[col].astype(object).dropna().unique(), dtype=object)
+            if dtype is None or not values.isin(dtype.categories).all():
+                categories = values if dtype is None else dtype.categories.astype(object).union(values)
+                try:
+                    # Sorted categories keep groupby(sort=True) output in value order
+                    categories = categories.sort_values()
+                except TypeError:
+                    pass
+                dtype = self._key_dtypes[col] = pd.CategoricalDtype(categories)
+                self._recode_loaded(col, dtype, skip=table_name)
+            df[col] = df[col].astype(dtype)
+    
+    def _recode_loaded(self, col: str, dtype: pd.CategoricalDtype, skip: str):
+        """
+        Move already-loaded categorical key columns onto a grown dtype.
+        
+        Tables still being built are recoded in place. Published tables may
+        be in use by other threads, so they are replaced by recoded copies
+        (shallow, so only the key column is new).
+        """
+        for name, other in self._building.items():
+            if name != skip and col in other.columns and isinstance(other[col].dtype, pd.CategoricalDtype):
+                other[col] = other[col].astype(dtype)
+        for name, other in list(self._dataframes.items()):
+            if col in other.columns and isinstance(other[col].dtype, pd.CategoricalDtype):
+                other = other.copy(deep=False)
+                other[col] = other[col].astype(dtype)
+                if name == "orders":
+                    # The approved view was taken from the old columns
+                    self._index_orders(other)
+                self._dataframes[name] = other
+    
+    def _index_dates(self, table_name: str, df: pd.DataFrame):
+        """Build sorted int64 sidecars for the parsed date columns of a table."""
+        for col in DATE_COLUMNS:
+            if col in df.columns and pd.api.types.is_datetime64_any_dtype(df[col]):
+                values = df[col].to_numpy(dtype="datetime64[ns]").view("i8")
+                order = np.argsort(values, kind="stable")
+                self._date_index[(table_name, col)] = (values[order], order)
+    
+    def _index_status(self, table_name: str, df: pd.DataFrame):
+        """Store label columns as categoricals and index row positions by status."""
+        for col in LABEL_COLUMNS:
+            if col in df.columns and not pd.api.types.is_numeric_dtype(df[col]):
+                df[col] = df[col].astype("category")
+        if "status" not in df.columns:
+            return
+        self._status_index[table_name] = df.groupby("status", observed=True, sort=False).indices
+        status = df["status"]
+        if isinstance(status.dtype, pd.CategoricalDtype):
+            self._status_codes[table_name] = (
+                status.cat.codes.to_numpy(),
+                tuple(str(v) for v in status.cat.categories),
+            )
+    
+    def _status_rows(self, table_name: str, status: str) -> Optional[np.ndarray]:
+        """Row positions of a table with the given status (None if unindexed)."""
+        index = self._status_index.get(table_name)
+        if index is None:
+            return None
+        return index.get(status, np.empty(0, dtype=np.intp))
+    
+    def _date_rows(
+        self,
+        table_name: str,
+        column: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+    ) -> Optional[np.ndarray]:
+        """
+        Row positions of a table whose `column` falls in [start_date, end_date].
+        
+        Uses binary search over the load-time date index, so the cost is
+        O(log N) plus the size of the result rather than a full scan.
+        A column that could not be parsed to dates has no index and is
+        compared as text instead. Returns None when there is nothing to
+        filter on.
+        """
+        if not start_date and not end_date:
+            return None
+        index = self._date_index.get((table_name, column))
+        if index is None:
+            df = self.get_table(table_name)
+            if df is None or column not in df.columns:
+                return None
+            return np.flatnonzero(_text_date_mask(df[column], start_date, end_date))
+        
+        values, order = index
+        lo, hi = _date_bounds(values, start_date, end_date)
+        return np.sort(order[lo:hi])
+    
+    def _filter_dates(
+        self,
+        table_name: str,
+        column: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+    ) -> pd.DataFrame:
+        """Get the rows of a table whose `column` falls in [start_date, end_date]."""
+        df = self.get_table(table_name)
+        rows = self._date_rows(table_name, column, start_date, end_date)
+        return df.take(rows) if rows is not None else df
+    
+    def _index_orders(self, orders: pd.DataFrame):
+        """Cache the approved-orders view and its merchant groupby."""
+        approved_rows = self._status_rows("orders", "approved")
+        # Positions are ascending, so the view keeps the created_at order
+        approved = orders.take(approved_rows) if approved_rows is not None else orders
+        
+        self._approved_orders = approved
+        if pd.api.types.is_datetime64_any_dtype(approved.get("created_at")):
+            # Orders are sorted by created_at at load (NaT first, like int64), so
+            # this stays sorted
+            self._approved_dates = approved["created_at"].to_numpy(dtype="datetime64[ns]").view("i8")
+        if "merchant_id" in approved.columns:
+            self._orders_by_merchant = approved.groupby("merchant_id", sort=False, observed=True)
+    
+    def _score_cache_path(self) -> Optional[Path]:
+        """
+        Parquet file for the users' ML scores, keyed on the scoring inputs.
+        
+        The key hashes the path, mtime and size of the source tables and of
+        the UC2 model, so any change to them misses the cache. Account age
+        is measured from today, so the scoring date is part of the key too.
+        """
+        from .ml_tool import UC2_MODEL_PATH
+        
+        if pa is None or not UC2_MODEL_PATH.exists():
+            return None
+        inputs = [self._table_paths[t] for t in SCORE_INPUT_TABLES if t in self._table_paths]
+        digest = hashlib.sha1(date.today().isoformat().encode())
+        for path in inputs + [UC2_MODEL_PATH]:
+            stat = path.stat()
+            digest.update(f"{path.resolve()}:{stat.st_mtime_ns}:{stat.st_size};".encode())
+        cache_dir = Path(os.getenv("SCORE_CACHE_DIR", self.data_path / ".cache"))
+        return cache_dir / f"user_scores_{digest.hexdigest()}.parquet"
+    
+    def _attach_scores(self, users: pd.DataFrame, probs: np.ndarray):
+        """Add the risk probability and derived scores to the users table."""
+        # Scores are 0-100, so int8 holds them; the float32 probability keeps
+        # far more precision than the forest's output has
+        score = ((1 - probs) * 100).astype(np.int8)
+        users["risk_probability"] = probs.astype(np.float32)
+        users["trust_score"] = score
+        users["risk_score"] = score # Alias for "User risk score" requests
+        
+        print(f"Enriched users table with ML scores. Avg Trust Score: {score.mean():.1f}")
+    
+    def _enrich_users_with_scores(self, users: pd.DataFrame):
         """Calculate and attach ML trust scores to users table."""
+        # Scores from an earlier run with the same inputs - skips loading the
+        # model and the order/installment/dispute tables entirely
+        cache_path = self._score_cache_path()
+        if cache_path is not None and cache_path.exists():
+            try:
+                probs = pd.read_parquet(cache_path)["risk_probability"].to_numpy()
+                if len(probs) == len(users):
+                    self._attach_scores(users, probs)
+                    return
+            except Exception as e:
+                print(f"Ignoring unreadable score cache {cache_path}: {e}")
+        
         try:
-            from .ml_tool import _load_uc2_model, _score_and_decide
+            from .ml_tool import _load_uc2_model, _predict_uc2_proba
             from datetime import datetime
             
             artifact = _load_uc2_model()
@@ -67,135 +487,176 @@ class LocalDataAdapter:
             model = artifact["model"]
             features_list = artifact["features"]
             
-            users = self._dataframes.get("users")
-            orders = self._dataframes.get("orders")
-            installments = self._dataframes.get("installments")
-            disputes = self._dataframes.get("disputes")
+            orders = self.get_table("orders")
+            installments = self.get_table("installments")
+            disputes = self.get_table("disputes")
             
-            if users is None:
+            if users.empty:
                 return
-
-            # Vectorized feature calculation would be better, but loop is safer for complex logic
-            # For hackathon/demo scale (small data), iteration is acceptable
             
-            scores = []
-            decisions = []
+            # Feature name -> numpy column (or a constant for every user)
+            columns = {"account_status_num": 1, "refunds_90d": 0, "checkout_abandon_rate_30d": 0.0}
+            user_ids = users["user_id"]
             
-            # Pre-calculate aggregates for speed
-            order_stats = {}
+            # Per-user aggregates, aligned to the users' row order
             if orders is not None:
-                order_stats = orders.groupby("user_id").agg({
-                    "order_id": "count",
-                    "amount": "sum"
-                }).to_dict(orient="index")
+                order_stats = _sum_by_key(orders["user_id"], {
+                    "orders_30d": orders["order_id"].notna().to_numpy(dtype=float),
+                    "amount_30d": orders["amount"].to_numpy(dtype=float, na_value=0.0),
+                })
+                columns.update(_align_to(order_stats, user_ids, ["orders_30d", "amount_30d"]))
             
-            inst_stats = {}
+            late_rate = 0.0
             if installments is not None:
-                # Group by user, then count status
-                def calc_rates(x):
-                    closed = (x["status"] != "due").sum()
-                    late = (x["status"] == "late").sum()
-                    active = (x["status"] == "due").sum()
-                    late_rate = late / closed if closed > 0 else 0.0
-                    return pd.Series([late_rate, active], index=["late_rate", "active"])
-                
-                inst_stats = installments.groupby("user_id").apply(calc_rates).to_dict(orient="index")
-
-            dispute_stats = {}
+                inst_stats = _count_by_status(installments["user_id"], installments["status"])
+                none = np.zeros(len(inst_stats), dtype=np.int64)
+                due = inst_stats["due"].to_numpy() if "due" in inst_stats else none
+                late = inst_stats["late"].to_numpy() if "late" in inst_stats else none
+                closed = inst_stats["_rows"].to_numpy() - due
+                inst_stats["active_plans"] = due
+                inst_stats["late_rate_90d"] = np.where(closed > 0, late / np.maximum(closed, 1), 0.0)
+                aligned = _align_to(inst_stats, user_ids, ["active_plans", "late_rate_90d"])
+                columns["active_plans"] = aligned["active_plans"]
+                late_rate = aligned["late_rate_90d"]
+            columns["late_rate_90d"] = late_rate
+            columns["ontime_rate_90d"] = 1.0 - late_rate
+            
             if disputes is not None:
-                dispute_stats = disputes.groupby("user_id").size().to_dict()
-
-            rows_to_predict = []
+                dispute_stats = _sum_by_key(disputes["user_id"], {"disputes_90d": np.ones(len(disputes))})
+                columns.update(_align_to(dispute_stats, user_ids, ["disputes_90d"]))
             
-            for _, row in users.iterrows():
-                uid = row.get("user_id")
-                
-                # Features
-                acc_age = 30
-                if "created_at" in row:
-                    try:
-                        acc_age = (datetime.now() - pd.to_datetime(row["created_at"])).days
-                    except: pass
-                
-                kyc = 1
-                try: kyc = int(row.get("kyc_level", 1)) 
-                except: pass
-                
-                # Aggregates
-                u_orders = order_stats.get(uid, {})
-                orders_30d = u_orders.get("order_id", 0)
-                amount_30d = u_orders.get("amount", 0)
-                
-                u_inst = inst_stats.get(uid, {})
-                late_rate = u_inst.get("late_rate", 0.0)
-                active_plans = int(u_inst.get("active", 0))
-                ontime_rate = 1.0 - late_rate
-                
-                disputes_90d = dispute_stats.get(uid, 0)
-                
-                feat_dict = {
-                    "account_age_days": acc_age,
-                    "kyc_level_num": kyc,
-                    "account_status_num": 1,
-                    "late_rate_90d": late_rate,
-                    "ontime_rate_90d": ontime_rate,
-                    "active_plans": active_plans,
-                    "orders_30d": orders_30d,
-                    "amount_30d": amount_30d,
-                    "disputes_90d": disputes_90d,
-                    "refunds_90d": 0,
-                    "checkout_abandon_rate_30d": 0.0
-                }
-                rows_to_predict.append(feat_dict)
+            if "created_at" in users.columns:
+                # Parsed at load; only re-parse if the column stayed text
+                created = users["created_at"]
+                if not pd.api.types.is_datetime64_any_dtype(created):
+                    created = pd.to_datetime(created, errors="coerce", format=DATE_FORMAT)
+                columns["account_age_days"] = (pd.Timestamp(datetime.now()) - created).dt.days.fillna(30).to_numpy()
+            else:
+                columns["account_age_days"] = 30
+            if "kyc_level" in users.columns:
+                # Non-numeric levels ("basic", ...) fall back to 1, as int() would
+                kyc = pd.to_numeric(users["kyc_level"].astype(object), errors="coerce").to_numpy(dtype=float)
+                columns["kyc_level_num"] = np.trunc(np.nan_to_num(kyc, nan=1.0))
+            else:
+                columns["kyc_level_num"] = 1
             
-            if not rows_to_predict:
-                return
-
-            # Batch Predict
-            X = pd.DataFrame(rows_to_predict)
-            # Ensure columns
-            for f in features_list:
-                if f not in X.columns: X[f] = 0
-            branch_X = X[features_list]
+            # Fill a float32 matrix column by column in training order (missing
+            # features stay 0). The forest compares float32 thresholds anyway,
+            # so this is the copy it would otherwise make itself
+            matrix = np.zeros((len(users), len(features_list)), dtype=np.float32)
+            for j, f in enumerate(features_list):
+                if f in columns:
+                    matrix[:, j] = columns[f]
+            branch_X = pd.DataFrame(matrix, columns=features_list, copy=False)
             
-            # Predict
-            # _score_and_decide returns (risk_proba, trust_score, decision)
-            # But it might not be vectorized in the tool depending on implementation.
-            # Let's call model.predict_proba directly for batch speed if possible, 
-            # or loop if safe. The ML tool helper is likely scalar.
-            # Accessing model directly:
-            probs = model.predict_proba(branch_X)[:, 1] # Probability of Class 1 (Risk)
+            # Predict all users in one batch (ONNX Runtime when the model has
+            # been exported, else the scikit-learn forest)
+            probs = _predict_uc2_proba(model, branch_X) # Probability of Class 1 (Risk)
             
             # Add to users DataFrame
-            self._dataframes["users"]["risk_probability"] = probs
-            self._dataframes["users"]["trust_score"] = ((1 - probs) * 100).astype(int)
-            self._dataframes["users"]["risk_score"] = ((1 - probs) * 100).astype(int) # Alias for "User risk score" requests
-            
-            print(f"Enriched users table with ML scores. Avg Trust Score: {self._dataframes['users']['trust_score'].mean():.1f}")
+            self._attach_scores(users, probs)
             
         except Exception as e:
             print(f"Batch scoring failed: {e}")
+            return
+        
+        if cache_path is not None:
+            try:
+                cache_path.parent.mkdir(parents=True, exist_ok=True)
+                for stale in cache_path.parent.glob("user_scores_*.parquet"):
+                    stale.unlink()
+                pd.DataFrame({"risk_probability": probs}).to_parquet(cache_path, compression="zstd")
+            except Exception as e:
+                print(f"Could not write score cache {cache_path}: {e}")
     
     @property
     def tables(self) -> List[str]:
-        """Get list of available tables."""
-        return list(self._dataframes.keys())
+        """Get list of available tables (loaded or not)."""
+        return list(self._table_paths.keys())
     
     def get_table(self, table_name: str) -> Optional[pd.DataFrame]:
-        """Get a table by name."""
-        return self._dataframes.get(table_name)
+        """Get a table by name, reading it from disk on first access."""
+        df = self._dataframes.get(table_name)
+        if df is None and table_name in self._table_paths:
+            with self._load_lock:
+                df = self._dataframes.get(table_name)
+                if df is None:
+                    df = self._load_table(table_name)
+        return df
+    
+    def get_string_column(self, table_name: str, column: str) -> Optional[pd.Series]:
+        """
+        Get a column cast to the pandas string dtype.
+        
+        The cast is done once per (table, column) and cached, so repeated
+        substring filters reuse the same array instead of re-casting.
+        """
+        key = (table_name, column)
+        if key not in self._string_columns:
+            df = self.get_table(table_name)
+            if df is None or column not in df.columns:
+                return None
+            self._string_columns[key] = df[column].astype("string")
+        return self._string_columns[key]
+    
+    def get_user_rows(self, table_name: str, user_id: Any) -> Optional[np.ndarray]:
+        """
+        Row positions of a table that belong to one user.
+        
+        The user_id -> positions map is built with one groupby per table and
+        cached, so each lookup is a dict access instead of a column scan.
+        Returns None when the table is missing or has no user_id column.
+        """
+        index = self._user_index.get(table_name)
+        if index is None:
+            df = self.get_table(table_name)
+            if df is None or "user_id" not in df.columns:
+                return None
+            index = df.groupby("user_id", observed=True, sort=False).indices
+            self._user_index[table_name] = index
+        return index.get(user_id, np.empty(0, dtype=np.intp))
+    
+    def count_statuses(self, table_name: str, rows: np.ndarray) -> Optional[Dict[str, int]]:
+        """
+        Count the rows at the given positions per status in one np.bincount.
+        
+        Statuses are categorical from load and their codes are kept as an
+        int8 array, so this is a gather plus a bincount. Rows with a missing
+        status are not counted. Returns None when the table has no status
+        column.
+        """
+        df = self.get_table(table_name)
+        if df is None or "status" not in df.columns:
+            return None
+        cached = self._status_codes.get(table_name)
+        if cached is not None:
+            codes, names = cached
+        else:
+            codes, values = _codes(df["status"])
+            names = [str(v) for v in values]
+        codes = codes[rows]
+        counts = np.bincount(codes[codes >= 0], minlength=len(names))
+        return dict(zip(names, counts.tolist()))
     
     def get_schema(self) -> Dict[str, List[str]]:
         """Get schema (table names and columns)."""
         schema = {}
-        for name, df in self._dataframes.items():
-            schema[name] = list(df.columns)
+        for name in self.tables:
+            df = self.get_table(name)
+            if df is not None:
+                schema[name] = list(df.columns)
         return schema
     
     def query(self, table_name: str, **kwargs) -> pd.DataFrame:
         """
         Query a table with filters.
         
+        The table is not copied up front: all filters are combined into one
+        mask and the table is indexed once. The result is always a new
+        DataFrame (a shallow copy when nothing is filtered), so under
+        Copy-on-Write mutating it copies lazily and never touches the cached
+        table.
+        
         Args:
             table_name: Name of the table
             **kwargs: Column filters (e.g., status='approved')
@@ -207,13 +668,24 @@ class LocalDataAdapter:
         if df is None:
             return pd.DataFrame()
         
-        result = df.copy()
+        # A status filter is answered from the load-time status index, and
+        # the remaining filters only look at those rows
+        rows = None
+        if "status" in kwargs and table_name in self._status_index:
+            rows = self._status_rows(table_name, kwargs.pop("status"))
         
+        masks = []
         for column, value in kwargs.items():
-            if column in result.columns:
-                result = result[result[column] == value]
+            if column in df.columns:
+                values = df[column] if rows is None else df[column].take(rows)
+                masks.append((values == value).to_numpy(dtype=bool, na_value=False))
+        if rows is not None:
+            return df.take(rows[np.logical_and.reduce(masks)] if masks else rows)
+        if not masks:
+            # Never hand out the cached table itself
+            return df.copy(deep=False)
         
-        return result
+        return df.loc[np.logical_and.reduce(masks)]
     
     # ==================
     # KPI Calculations
@@ -225,44 +697,31 @@ class LocalDataAdapter:
         if orders is None:
             return {"value": 0, "error": "Orders table not found"}
         
-        # Filter by status
-        approved = orders[orders["status"] == "approved"] if "status" in orders.columns else orders
+        approved = self._approved_orders
+        amounts = approved["amount"].to_numpy() if "amount" in approved.columns else None
         
-        # Filter by date if available
-        if start_date and "created_at" in approved.columns:
-            approved = approved[approved["created_at"] >= start_date]
-        if end_date and "created_at" in approved.columns:
-            approved = approved[approved["created_at"] <= end_date]
+        # Filter by date if available (contiguous slice of the sorted view)
+        window = slice(0, len(approved))
+        order_count = len(approved)
+        if self._approved_dates is not None and (start_date or end_date):
+            lo, hi = _date_bounds(self._approved_dates, start_date, end_date)
+            window, order_count = slice(lo, hi), hi - lo
+        elif (start_date or end_date) and "created_at" in approved.columns:
+            # created_at could not be parsed to dates - compare it as text
+            window = _text_date_mask(approved["created_at"], start_date, end_date)
+            order_count = int(window.sum())
         
-        gmv = approved["amount"].sum() if "amount" in approved.columns else 0
+        gmv = amounts[window].sum() if amounts is not None else 0
         
         return {
             "value": float(gmv),
-            "order_count": len(approved),
+            "order_count": order_count,
         }
     
     def calculate_approval_rate(self, start_date: Optional[str] = None, end_date: Optional[str] = None) -> Dict[str, Any]:
         """Calculate approval rate."""
-        orders = self.get_table("orders")
-        if orders is None:
-            return {"value": 0, "error": "Orders table not found"}
-        
-        # Filter by date if available
-        if start_date and "created_at" in orders.columns:
-            orders = orders[orders["created_at"] >= start_date]
-        if end_date and "created_at" in orders.columns:
-            orders = orders[orders["created_at"] <= end_date]
-        
-        total = len(orders)
-        approved = len(orders[orders["status"] == "approved"]) if "status" in orders.columns else 0
-        
-        rate = approved / total if total > 0 else 0
-        
-        return {
-            "value": float(rate),
-            "approved": approved,
-            "total": total,
-        }
+        # Only the status column of the window is gathered
+        return self.calculate_metrics_bundle(start_date, end_date, {"approval_rate"})["approval_rate"]
     
     def calculate_late_rate(self, start_date: Optional[str] = None, end_date: Optional[str] = None) -> Dict[str, Any]:
         """Calculate late payment rate."""
@@ -270,14 +729,15 @@ class LocalDataAdapter:
         if installments is None:
             return {"value": 0, "error": "Installments table not found"}
         
-        # Filter by date if available
-        if start_date and "due_date" in installments.columns:
-            installments = installments[installments["due_date"] >= start_date]
-        if end_date and "due_date" in installments.columns:
-            installments = installments[installments["due_date"] <= end_date]
-        
-        total = len(installments)
-        late = len(installments[installments["status"] == "late"]) if "status" in installments.columns else 0
+        # Filter by date if available - gather only the status column
+        rows = self._date_rows("installments", "due_date", start_date, end_date)
+        total = len(rows) if rows is not None else len(installments)
+        late = 0
+        if "status" in installments.columns:
+            status = installments["status"]
+            if rows is not None:
+                status = status.take(rows)
+            late = int((status == "late").sum())
         
         rate = late / total if total > 0 else 0
         
@@ -289,21 +749,90 @@ class LocalDataAdapter:
     
     def calculate_active_users(self, start_date: Optional[str] = None, end_date: Optional[str] = None) -> Dict[str, Any]:
         """Calculate active users."""
+        # Only the status and user_id columns of the window are gathered
+        return self.calculate_metrics_bundle(start_date, end_date, {"active_users"})["active_users"]
+    
+    def calculate_metrics_bundle(
+        self,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        metrics=ORDER_METRICS,
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Calculate several order KPIs over the same date window in one pass.
+        
+        The created_at window is located once and gmv, approval_rate and
+        active_users are all derived from the same rows. Results match the
+        individual calculate_* methods and are memoized per window.
+        
+        Args:
+            start_date: Window start (inclusive)
+            end_date: Window end (inclusive)
+            metrics: Any of ORDER_METRICS
+            
+        Returns:
+            Dict of metric name -> result dict
+        """
+        metrics = frozenset(metrics) & frozenset(ORDER_METRICS)
+        key = (start_date, end_date, metrics)
+        cached = self._metrics_cache.get(key)
+        if cached is None:
+            cached = self._compute_metrics_bundle(start_date, end_date, metrics)
+            if len(self._metrics_cache) >= _METRICS_CACHE_SIZE:
+                self._metrics_cache.pop(next(iter(self._metrics_cache)))
+            self._metrics_cache[key] = cached
+        # Callers add breakdowns to the result dicts - hand out copies
+        return {name: dict(result) for name, result in cached.items()}
+    
+    def _compute_metrics_bundle(
+        self,
+        start_date: Optional[str],
+        end_date: Optional[str],
+        metrics: frozenset,
+    ) -> Dict[str, Dict[str, Any]]:
         orders = self.get_table("orders")
         if orders is None:
-            return {"value": 0, "error": "Orders table not found"}
+            return {name: {"value": 0, "error": "Orders table not found"} for name in metrics}
         
-        # Filter by date if available
-        if start_date and "created_at" in orders.columns:
-            orders = orders[orders["created_at"] >= start_date]
-        if end_date and "created_at" in orders.columns:
-            orders = orders[orders["created_at"] <= end_date]
+        # Gather only the needed columns for the window, once
+        needed = {"status"}
+        if "gmv" in metrics:
+            needed.add("amount")
+        if "active_users" in metrics:
+            needed.add("user_id")
+        window = orders[[c for c in orders.columns if c in needed]]
+        rows = self._date_rows("orders", "created_at", start_date, end_date)
+        if rows is not None:
+            window = window.take(rows)
         
-        active = orders["user_id"].nunique() if "user_id" in orders.columns else 0
+        total = len(window)
+        has_status = "status" in window.columns
+        approved_mask = (window["status"] == "approved").to_numpy() if has_status else None
+        approved = int(approved_mask.sum()) if has_status else 0
         
-        return {
-            "value": int(active),
-        }
+        results = {}
+        if "gmv" in metrics:
+            # Like calculate_gmv: without a status column every order counts
+            gmv = 0
+            if "amount" in window.columns:
+                amounts = window["amount"].to_numpy()
+                gmv = amounts[approved_mask].sum() if has_status else amounts.sum()
+            results["gmv"] = {"value": float(gmv), "order_count": approved if has_status else total}
+        if "approval_rate" in metrics:
+            results["approval_rate"] = {
+                "value": float(approved / total if total > 0 else 0),
+                "approved": approved,
+                "total": total,
+            }
+        if "active_users" in metrics:
+            if "user_id" not in window.columns:
+                active = 0
+            elif window["user_id"].dtype.kind in "iu":
+                active = len(np.unique(window["user_id"].to_numpy()))
+            else:
+                active = window["user_id"].nunique()
+            results["active_users"] = {"value": int(active)}
+        return results
     
     def get_top_merchants(self, metric: str = "gmv", limit: int = 10) -> pd.DataFrame:
         """Get top merchants by metric."""
@@ -314,16 +843,18 @@ class LocalDataAdapter:
             return pd.DataFrame()
         
         if metric == "gmv":
-            approved = orders[orders["status"] == "approved"] if "status" in orders.columns else orders
-            result = approved.groupby("merchant_id").agg({
-                "amount": "sum",
-                "order_id": "count"
-            }).reset_index()
-            result.columns = ["merchant_id", "gmv", "order_count"]
-            result = result.sort_values("gmv", ascending=False).head(limit)
+            # nlargest is a partial sort - O(N log k) rather than a full sort
+            result = self._orders_by_merchant.agg(
+                gmv=("amount", "sum"),
+                order_count=("order_id", "count"),
+            ).nlargest(limit, "gmv").reset_index()
         else:
-            result = orders.groupby("merchant_id").size().reset_index(name="count")
-            result = result.sort_values("count", ascending=False).head(limit)
+            result = (
+                orders.groupby("merchant_id", sort=False, observed=True)
+                .size()
+                .nlargest(limit)
+                .reset_index(name="count")
+            )
         
         # Join with merchant names if available
         if merchants is not None and "merchant_name" in merchants.columns:
@@ -341,27 +872,18 @@ class LocalDataAdapter:
         if installments is None or "late_days" not in installments.columns:
             return pd.DataFrame()
         
-        late = installments[installments["status"] == "late"] if "status" in installments.columns else installments
-        
-        def bucket(days):
-            if pd.isna(days) or days <= 0:
-                return "Not Late"
-            elif days <= 7:
-                return "1-7 days"
-            elif days <= 30:
-                return "8-30 days"
-            elif days <= 60:
-                return "31-60 days"
-            else:
-                return "60+ days"
-        
-        late["bucket"] = late["late_days"].apply(bucket)
-        result = late.groupby("bucket").size().reset_index(name="count")
+        days = installments["late_days"].to_numpy(dtype=float, na_value=np.nan)
+        late_rows = self._status_rows("installments", "late")
+        if late_rows is not None:
+            days = days[late_rows]
         
-        # Order buckets
-        bucket_order = ["1-7 days", "8-30 days", "31-60 days", "60+ days"]
-        result["order"] = result["bucket"].apply(lambda x: bucket_order.index(x) if x in bucket_order else 99)
-        result = result.sort_values("order").drop(columns=["order"])
+        # Ordered categorical labels, as pd.cut would give, so sorting by
+        # bucket follows severity rather than the alphabet
+        result = pd.DataFrame({
+            "bucket": pd.Categorical(DELINQUENCY_BUCKETS, categories=DELINQUENCY_BUCKETS, ordered=True),
+            "count": _bucket_histogram(days),
+        })
+        result = result[result["count"] > 0].reset_index(drop=True)
         
         return result
 
@@ -5,11 +5,86 @@ This module provides the foundation for all MCP tool wrappers,
 handling connection, authentication, and request/response processing.
 """
 
+import asyncio
+import atexit
+import itertools
+import json
 import os
+import random
+import weakref
 import httpx
-from typing import Any, Optional
+from typing import Any, List, Optional, Tuple
 from pydantic import BaseModel, Field
 
+try:
+    import orjson
+except ImportError:  # Optional - falls back to the stdlib json module
+    orjson = None
+
+try:
+    import h2  # noqa: F401 - enables HTTP/2 in httpx
+    HTTP2_AVAILABLE = True
+except ImportError:  # Optional - falls back to HTTP/1.1 keep-alive
+    HTTP2_AVAILABLE = False
+
+# Connection pool shared by all calls of a client: concurrent tool calls
+# reuse open connections (multiplexed over one with HTTP/2) instead of
+# paying a new TCP/TLS handshake each
+POOL_LIMITS = httpx.Limits(
+    max_connections=128,
+    max_keepalive_connections=64,
+    keepalive_expiry=60.0,
+)
+
+
+def _dumps(obj: Any) -> bytes:
+    """Serialize a JSON-RPC payload to bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj).encode()
+
+
+def canonical_json(obj: Any) -> bytes:
+    """Serialize with sorted keys - equal params give equal bytes (cache keys)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, sort_keys=True).encode()
+
+
+def _loads(data: bytes) -> Any:
+    """Parse a JSON-RPC response body."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+# Whether tools answer with mock data when the MCP server can't (demo/dev).
+# Read once at import; set MOCK_FALLBACK=false in production to get an
+# explicit error instead of made-up numbers.
+MOCK_FALLBACK = os.getenv("MOCK_FALLBACK", "true").lower() == "true"
+
+# Failures worth another attempt: the server dropped a pooled connection
+# mid-request or is briefly overloaded. Connection refused (server down) and
+# timeouts are not retried - they would only delay the caller's fallback.
+_RETRYABLE_ERRORS = (httpx.ReadError, httpx.WriteError, httpx.RemoteProtocolError)
+_RETRYABLE_STATUS = frozenset({429, 502, 503, 504})
+
+# Bodies larger than this are decoded on a worker thread
+_THREAD_DECODE_BYTES = 256 * 1024
+
+
+async def _decode(data: bytes) -> Any:
+    """
+    Parse a response body, off the event loop when it is large.
+    
+    Big SQL result sets take long enough to parse that they would stall
+    other in-flight calls; small bodies are cheaper to parse inline than
+    to hand to a thread.
+    """
+    if len(data) > _THREAD_DECODE_BYTES:
+        return await asyncio.to_thread(_loads, data)
+    return _loads(data)
+
 
 class MCPClientConfig(BaseModel):
     """Configuration for MCP client."""
@@ -21,6 +96,16 @@ class MCPClientConfig(BaseModel):
         default_factory=lambda: os.getenv("MCP_API_KEY")
     )
     timeout: float = Field(default=30.0)
+    # Kept short: a server that doesn't accept connections won't recover
+    # within the call, and the tools have fallbacks to move on to. The
+    # transports retry one failed connect, so an unreachable server fails
+    # after about twice this (~10s)
+    connect_timeout: float = Field(default=5.0)
+    
+    @property
+    def timeouts(self) -> httpx.Timeout:
+        """Per-request timeouts for the HTTP clients."""
+        return httpx.Timeout(self.timeout, connect=self.connect_timeout)
 
 
 class MCPResponse(BaseModel):
@@ -45,7 +130,15 @@ class MCPClient:
     
     def __init__(self, config: Optional[MCPClientConfig] = None):
         self.config = config or MCPClientConfig()
-        self._client: Optional[httpx.AsyncClient] = None
+        # One async client per event loop: pooled connections belong to the
+        # loop that opened them (e.g. the tools' background loop vs the app's)
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+            weakref.WeakKeyDictionary()
+        )
+        # Blocking client for callers without an event loop (tool _run)
+        self._sync_client: Optional[httpx.Client] = None
+        # JSON-RPC ids - unique per client so batch responses can be matched
+        self._ids = itertools.count(1)
     
     @property
     def headers(self) -> dict:
@@ -59,14 +152,38 @@ class MCPClient:
         return headers
     
     async def _get_client(self) -> httpx.AsyncClient:
-        """Get or create async HTTP client."""
-        if self._client is None or self._client.is_closed:
-            self._client = httpx.AsyncClient(
+        """Get or create the async HTTP client of the running event loop."""
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None or client.is_closed:
+            client = self._clients[loop] = httpx.AsyncClient(
                 base_url=self.config.server_url,
                 headers=self.headers,
-                timeout=self.config.timeout,
+                timeout=self.config.timeouts,
+                # Pool settings live on the transport when one is passed;
+                # retries only cover failed connection attempts
+                transport=httpx.AsyncHTTPTransport(
+                    http2=HTTP2_AVAILABLE,
+                    limits=POOL_LIMITS,
+                    retries=1,
+                ),
             )
-        return self._client
+        return client
+    
+    def _get_sync_client(self) -> httpx.Client:
+        """Get or create the blocking HTTP client."""
+        if self._sync_client is None or self._sync_client.is_closed:
+            self._sync_client = httpx.Client(
+                base_url=self.config.server_url,
+                headers=self.headers,
+                timeout=self.config.timeouts,
+                transport=httpx.HTTPTransport(
+                    http2=HTTP2_AVAILABLE,
+                    limits=POOL_LIMITS,
+                    retries=1,
+                ),
+            )
+        return self._sync_client
     
     async def call(
         self,
@@ -85,57 +202,197 @@ class MCPClient:
         """
         client = await self._get_client()
         
-        payload = {
-            "jsonrpc": "2.0",
-            "method": method,
-            "params": params or {},
-            "id": 1,
-        }
+        payload = self._request(method, params)
         
         try:
-            response = await client.post("/mcp", json=payload)
+            response = await client.post("/mcp", content=_dumps(payload))
             response.raise_for_status()
             
-            result = response.json()
+            return self._to_response(await _decode(await response.aread()))
+            
+        except Exception as e:
+            return self._to_error(e)
+    
+    def call_sync(
+        self,
+        method: str,
+        params: Optional[dict] = None,
+    ) -> MCPResponse:
+        """
+        Call an MCP method without an event loop.
+        
+        Same contract as call(), over a blocking connection pool, so
+        synchronous tool runs don't have to start a loop per call.
+        """
+        client = self._get_sync_client()
+        
+        payload = self._request(method, params)
+        
+        try:
+            response = client.post("/mcp", content=_dumps(payload))
+            response.raise_for_status()
             
-            if "error" in result:
-                return MCPResponse(
-                    success=False,
-                    error=result["error"].get("message", "Unknown error"),
-                    metadata={"code": result["error"].get("code")},
-                )
+            return self._to_response(_loads(response.content))
             
-            return MCPResponse(
-                success=True,
-                data=result.get("result"),
-                metadata={"id": result.get("id")},
-            )
+        except Exception as e:
+            return self._to_error(e)
+    
+    async def call_many(
+        self,
+        requests: List[Tuple[str, Optional[dict]]],
+    ) -> List[MCPResponse]:
+        """
+        Call several MCP methods in one JSON-RPC batch request.
+        
+        The whole batch costs one round trip instead of one per call.
+        Responses are matched to requests by id, since servers may answer
+        a batch in any order. If the server does not accept batches, the
+        calls are made one by one instead.
+        
+        Args:
+            requests: (method, params) pairs
             
+        Returns:
+            One MCPResponse per request, in request order
+        """
+        if not requests:
+            return []
+        
+        client = await self._get_client()
+        
+        payload = [self._request(method, params) for method, params in requests]
+        
+        try:
+            response = await client.post("/mcp", content=_dumps(payload))
+            response.raise_for_status()
+            results = await _decode(await response.aread())
         except httpx.HTTPStatusError as e:
+            if e.response.status_code not in (400, 404, 405, 415, 422):
+                error = f"HTTP error: {e.response.status_code}"
+                return [
+                    MCPResponse(success=False, error=error, metadata={"status_code": e.response.status_code})
+                    for _ in requests
+                ]
+            results = None
+        except httpx.RequestError as e:
+            return [MCPResponse(success=False, error=f"Request error: {str(e)}") for _ in requests]
+        except Exception as e:
+            return [MCPResponse(success=False, error=f"Unexpected error: {str(e)}") for _ in requests]
+        
+        if not isinstance(results, list):
+            # A single error object (or a rejected request) - no batch support
+            return [await self.call(method, params) for method, params in requests]
+        
+        by_id = {result.get("id"): result for result in results if isinstance(result, dict)}
+        return [
+            self._to_response(by_id[request["id"]])
+            if request["id"] in by_id
+            else MCPResponse(success=False, error="No response in batch")
+            for request in payload
+        ]
+    
+    def _request(self, method: str, params: Optional[dict]) -> dict:
+        """Build a JSON-RPC request with a fresh id."""
+        return {
+            "jsonrpc": "2.0",
+            "method": method,
+            "params": params or {},
+            "id": next(self._ids),
+        }
+    
+    @staticmethod
+    def _to_error(e: Exception) -> MCPResponse:
+        """Convert a failed call's exception to an MCPResponse."""
+        if isinstance(e, httpx.HTTPStatusError):
+            status = e.response.status_code
             return MCPResponse(
                 success=False,
-                error=f"HTTP error: {e.response.status_code}",
-                metadata={"status_code": e.response.status_code},
+                error=f"HTTP error: {status}",
+                metadata={"status_code": status, "retryable": status in _RETRYABLE_STATUS},
             )
-        except httpx.RequestError as e:
+        if isinstance(e, httpx.RequestError):
             return MCPResponse(
                 success=False,
                 error=f"Request error: {str(e)}",
+                metadata={"retryable": isinstance(e, _RETRYABLE_ERRORS)},
             )
-        except Exception as e:
+        return MCPResponse(
+            success=False,
+            error=f"Unexpected error: {str(e)}",
+        )
+    
+    @staticmethod
+    def _to_response(result: dict) -> MCPResponse:
+        """Convert one JSON-RPC response object to an MCPResponse."""
+        if "error" in result:
             return MCPResponse(
                 success=False,
-                error=f"Unexpected error: {str(e)}",
+                error=result["error"].get("message", "Unknown error"),
+                metadata={"code": result["error"].get("code")},
             )
+        
+        return MCPResponse(
+            success=True,
+            data=result.get("result"),
+            metadata={"id": result.get("id")},
+        )
     
     async def close(self):
-        """Close the HTTP client."""
-        if self._client and not self._client.is_closed:
-            await self._client.aclose()
-            self._client = None
+        """Close the HTTP clients (the async one of the running loop)."""
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client and not client.is_closed:
+            await client.aclose()
+        if self._sync_client and not self._sync_client.is_closed:
+            self._sync_client.close()
+            self._sync_client = None
+    
+    def close_all(self, timeout: float = 1.0):
+        """
+        Close every HTTP client from synchronous code (process exit).
+        
+        Async clients are closed on their own loop, for loops that are
+        still running (e.g. the tools' background loop); the others went
+        away with their loop.
+        """
+        for loop, client in list(self._clients.items()):
+            if client.is_closed or not loop.is_running():
+                continue
+            try:
+                asyncio.run_coroutine_threadsafe(client.aclose(), loop).result(timeout)
+            except Exception:
+                pass
+        self._clients.clear()
+        if self._sync_client and not self._sync_client.is_closed:
+            self._sync_client.close()
+            self._sync_client = None
+
+
+async def resilient_call(
+    client: MCPClient,
+    method: str,
+    params: Optional[dict] = None,
+    retries: int = 3,
+    base_delay: float = 0.2,
+) -> MCPResponse:
+    """
+    Call an MCP method, retrying transient failures.
+    
+    Up to `retries` attempts with exponential backoff plus jitter, so a
+    brief server hiccup doesn't send the tool to its mock fallback and
+    callers retrying together don't hit the server in lockstep. Errors
+    not marked retryable are returned immediately.
+    """
+    for attempt in range(retries):
+        response = await client.call(method, params)
+        if response.success or not response.metadata.get("retryable"):
+            return response
+        if attempt < retries - 1:
+            await asyncio.sleep(base_delay * 2 ** attempt + random.random() * 0.05)
+    return response
 
 
-# Singleton client instance
+# Singleton client instance - one connection pool (per event loop) shared by
+# every tool call for the life of the process
 _mcp_client: Optional[MCPClient] = None
 
 
@@ -144,4 +401,5 @@ def get_mcp_client() -> MCPClient:
     global _mcp_client
     if _mcp_client is None:
         _mcp_client = MCPClient()
+        atexit.register(_mcp_client.close_all)
     return _mcp_client
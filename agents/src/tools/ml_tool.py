@@ -8,20 +8,32 @@ Provides access to:
 
 import os
 import asyncio
+import threading
+from collections import OrderedDict
 from pathlib import Path
 from typing import Optional, Dict, Any, Literal
 from pydantic import BaseModel, Field
 from langchain_core.tools import BaseTool
+import numpy as np
 import pandas as pd
 
 # Model paths relative to the agent directory
 ML_DIR = Path(__file__).resolve().parents[3] / "ML" / "to_test_agent"
 UC1_MODEL_PATH = ML_DIR / "uc1_Late_Pay_Risk" / "model" / "bnpl_pay_late_risk_model.pkl"
 UC2_MODEL_PATH = ML_DIR / "uc2_Risk_Score" / "model" / "rf_bnpl_v1.joblib"
+# ONNX export of the UC2 model (pipelines/uc2_model_to_onnx.py)
+UC2_ONNX_PATH = UC2_MODEL_PATH.with_suffix(".onnx")
+
+try:
+    import onnxruntime
+except ImportError:  # Optional - falls back to scikit-learn predict_proba
+    onnxruntime = None
 
 # Cached models (loaded once)
 _uc1_model = None
 _uc2_artifact = None
+_uc2_lock = threading.Lock()
+_uc2_onnx = None
 
 
 def _load_uc1_model():
@@ -44,11 +56,118 @@ def _load_uc2_model():
     """Load UC2 Risk Score model (joblib)."""
     global _uc2_artifact
     if _uc2_artifact is None and UC2_MODEL_PATH.exists():
-        import joblib
-        _uc2_artifact = joblib.load(UC2_MODEL_PATH)
+        # Callers wait here while the import-time prefetch is still loading
+        with _uc2_lock:
+            if _uc2_artifact is None:
+                import joblib
+                # Uncompressed joblib file: numpy arrays are memory-mapped
+                # rather than read into memory
+                artifact = joblib.load(UC2_MODEL_PATH, mmap_mode="r")
+                # Fixed feature order, read on every scoring call
+                artifact["features"] = tuple(artifact["features"])
+                # Published last, so lock-free readers see it complete
+                _uc2_artifact = artifact
     return _uc2_artifact
 
 
+def _load_uc2_onnx():
+    """Load the ONNX export of the UC2 model (None if unavailable or stale)."""
+    global _uc2_onnx
+    if _uc2_onnx is None:
+        _uc2_onnx = False
+        # An export older than the joblib model was made from a previous model
+        if (
+            onnxruntime is not None
+            and UC2_ONNX_PATH.exists()
+            and UC2_ONNX_PATH.stat().st_mtime >= UC2_MODEL_PATH.stat().st_mtime
+        ):
+            try:
+                _uc2_onnx = onnxruntime.InferenceSession(
+                    str(UC2_ONNX_PATH), providers=["CPUExecutionProvider"]
+                )
+            except Exception as e:
+                print(f"Warning: UC2 ONNX model failed to load: {e}")
+    return _uc2_onnx or None
+
+
+def _feature_row(features: Dict[str, Any], expected_features) -> np.ndarray:
+    """One-row UC2 feature matrix in training order; missing features are 0."""
+    return np.fromiter(
+        (features.get(feat, 0) for feat in expected_features),
+        dtype=np.float64,
+        count=len(expected_features),
+    ).reshape(1, -1)
+
+
+def _predict_uc2_proba(model, X) -> np.ndarray:
+    """
+    Risk probability (class 1) of the UC2 model for each row of X.
+    
+    Uses the compiled ONNX Runtime predictor when an export is available,
+    otherwise the scikit-learn forest. X is a DataFrame or 2-D array holding
+    the model's features in training order.
+    """
+    session = _load_uc2_onnx()
+    if session is not None:
+        # Trees compare float32 thresholds, as scikit-learn does internally
+        inputs = {session.get_inputs()[0].name: np.asarray(X, dtype=np.float32)}
+        return session.run(["probabilities"], inputs)[0][:, 1]
+    if isinstance(X, np.ndarray) and hasattr(model, "feature_names_in_"):
+        # Name the columns so scikit-learn doesn't warn about missing feature names
+        X = pd.DataFrame(X, columns=model.feature_names_in_, copy=False)
+    return model.predict_proba(X)[:, 1]
+
+
+# Concurrent single-row UC2 predictions are coalesced into one model call
+_BATCH_SIZE = 32
+_BATCH_MAX_WAIT = 0.002  # seconds
+# Pending (row, future) pairs, keyed by (event loop, model id)
+_uc2_batches: Dict[tuple, list] = {}
+
+
+def _flush_uc2_batch(key: tuple, model) -> None:
+    """Score a pending batch with one model call and resolve its futures."""
+    batch = _uc2_batches.pop(key, None)
+    if not batch:
+        return
+    rows, futures = zip(*batch)
+    try:
+        probs = _predict_uc2_proba(model, np.vstack(rows)).tolist()
+    except Exception as e:
+        for future in futures:
+            if not future.done():
+                future.set_exception(e)
+        return
+    for future, proba in zip(futures, probs):
+        if not future.done():
+            future.set_result(proba)
+
+
+async def _batched_predict(model, X_row: np.ndarray) -> float:
+    """
+    Risk probability of a single feature row, batched with concurrent calls.
+    
+    A batch is scored once it holds _BATCH_SIZE rows or _BATCH_MAX_WAIT
+    after its first row arrived, whichever comes first.
+    """
+    loop = asyncio.get_running_loop()
+    key = (loop, id(model))
+    future = loop.create_future()
+    batch = _uc2_batches.setdefault(key, [])
+    batch.append((X_row, future))
+    if len(batch) >= _BATCH_SIZE:
+        _flush_uc2_batch(key, model)
+    elif len(batch) == 1:
+        loop.call_later(_BATCH_MAX_WAIT, _flush_uc2_batch, key, model)
+    return await future
+
+
+# Load the UC2 model in the background so it is usually ready by the time
+# users are scored
+if UC2_MODEL_PATH.exists():
+    threading.Thread(target=_load_uc2_model, name="uc2-model-prefetch", daemon=True).start()
+
+
 # =====================================================
 # UC2 Risk Engine Logic (adapted from risk_engine.py)
 # =====================================================
@@ -57,6 +176,23 @@ DECISION_RULES = {
     "approve": 70,
     "limit": 40
 }
+# Read once: decisions are cached with their scores, so the rules are
+# fixed for the life of the process anyway
+_APPROVE_AT = DECISION_RULES["approve"]
+_LIMIT_AT = DECISION_RULES["limit"]
+
+# decision -> (emoji, display text)
+DECISION_DISPLAY = {
+    "APPROVED_3X": ("🟢", "APPROVED (3X)"),
+    "APPROVED_WITH_LIMIT": ("🟡", "APPROVED WITH LIMIT"),
+    "REJECTED_3X": ("🔴", "REJECTED"),
+}
+
+# is_late -> (emoji, risk level, prediction text)
+LATE_RISK_DISPLAY = {
+    True: ("🔴", "HIGH", "LIKELY TO BE LATE"),
+    False: ("🟢", "LOW", "LIKELY ON TIME"),
+}
 
 EXPLANATION_THRESHOLDS = {
     "late_rate_high": 0.3,
@@ -67,22 +203,64 @@ EXPLANATION_THRESHOLDS = {
 }
 
 
-def _score_and_decide(model, X_row: pd.DataFrame) -> tuple:
-    """Calculate trust score and decision from model prediction."""
-    risk_proba = model.predict_proba(X_row)[0][1]
+# Single-row UC2 results, keyed by model and exact feature values (LRU)
+_SCORE_CACHE_SIZE = 4096
+_score_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+_score_cache_lock = threading.Lock()
+
+
+def _score_key(model, X_row: np.ndarray) -> tuple:
+    """Score cache key of a feature row."""
+    return (id(model), np.asarray(X_row, dtype=np.float64).tobytes())
+
+
+def _cached_score(key: tuple) -> Optional[tuple]:
+    """Cached (risk_proba, trust_score, decision) for a key, if any."""
+    with _score_cache_lock:
+        cached = _score_cache.get(key)
+        if cached is not None:
+            _score_cache.move_to_end(key)
+        return cached
+
+
+def _decide(key: tuple, risk_proba: float) -> tuple:
+    """Trust score and decision for a risk probability, cached under key."""
     trust_score = round(100 * (1 - risk_proba))
     
-    if trust_score >= DECISION_RULES["approve"]:
+    if trust_score >= _APPROVE_AT:
         decision = "APPROVED_3X"
-    elif trust_score >= DECISION_RULES["limit"]:
+    elif trust_score >= _LIMIT_AT:
         decision = "APPROVED_WITH_LIMIT"
     else:
         decision = "REJECTED_3X"
     
-    return risk_proba, trust_score, decision
+    result = (risk_proba, trust_score, decision)
+    with _score_cache_lock:
+        _score_cache[key] = result
+        if len(_score_cache) > _SCORE_CACHE_SIZE:
+            _score_cache.popitem(last=False)
+    return result
 
 
-def _explain_score(row: pd.Series) -> str:
+def _score_and_decide(model, X_row: np.ndarray) -> tuple:
+    """Calculate trust score and decision from model prediction."""
+    key = _score_key(model, X_row)
+    cached = _cached_score(key)
+    if cached is not None:
+        return cached
+    return _decide(key, float(_predict_uc2_proba(model, X_row)[0]))
+
+
+async def _ascore_and_decide(model, X_row: np.ndarray) -> tuple:
+    """Like _score_and_decide, batching the model call with concurrent callers."""
+    key = _score_key(model, X_row)
+    cached = _cached_score(key)
+    if cached is not None:
+        return cached
+    return _decide(key, await _batched_predict(model, X_row))
+
+
+def _explain_score(row: Dict[str, Any]) -> str:
     """Generate human-readable explanation for the score."""
     reasons = []
     
@@ -157,8 +335,13 @@ class MLPredictionTool(BaseTool):
         prediction_type: Literal["late_payment", "trust_score"],
         features: Dict[str, Any],
     ) -> str:
-        """Synchronous prediction."""
-        return asyncio.run(self._arun(prediction_type, features))
+        """Synchronous prediction - calls the models directly, no event loop."""
+        if prediction_type == "late_payment":
+            return self._predict_late_payment(features)
+        elif prediction_type == "trust_score":
+            return self._predict_trust_score(features)
+        else:
+            return f"Error: Unknown prediction_type '{prediction_type}'. Use 'late_payment' or 'trust_score'."
     
     async def _arun(
         self,
@@ -166,12 +349,10 @@ class MLPredictionTool(BaseTool):
         features: Dict[str, Any],
     ) -> str:
         """Run ML prediction based on type."""
-        if prediction_type == "late_payment":
-            return self._predict_late_payment(features)
-        elif prediction_type == "trust_score":
-            return self._predict_trust_score(features)
-        else:
-            return f"Error: Unknown prediction_type '{prediction_type}'. Use 'late_payment' or 'trust_score'."
+        if prediction_type == "trust_score":
+            # Batched with concurrent trust score requests on this loop
+            return await self._apredict_trust_score(features)
+        return self._run(prediction_type, features)
     
     def _predict_late_payment(self, features: Dict[str, Any]) -> str:
         """UC1: Predict late payment risk."""
@@ -186,8 +367,15 @@ class MLPredictionTool(BaseTool):
             X = pd.DataFrame([features])
             
             # Get prediction
-            prediction = model.predict(X)[0]
-            probability = model.predict_proba(X)[0][1] if hasattr(model, 'predict_proba') else None
+            if hasattr(model, "predict_proba"):
+                # One pass over the model: predict() would recompute the
+                # same probabilities just to take their argmax
+                proba = model.predict_proba(X)[0]
+                prediction = model.classes_[proba.argmax()]
+                probability = proba[1]
+            else:
+                prediction = model.predict(X)[0]
+                probability = None
             
             return self._format_late_payment_result(prediction, probability, features)
         except Exception as e:
@@ -237,31 +425,20 @@ class MLPredictionTool(BaseTool):
         probability = min(risk_score / 100, 0.95)
         
         # Format result
-        risk_level = "HIGH" if is_late else "LOW"
-        emoji = "🔴" if is_late else "🟢"
-        
-        lines = [
-            f"# Late Payment Risk: {emoji} {risk_level}",
-            "",
-            f"**Prediction**: {'LIKELY TO BE LATE' if is_late else 'LIKELY ON TIME'}",
-            f"**Risk Score**: {risk_score}/100",
-            f"**Risk Probability**: {probability:.1%}",
-            "",
-        ]
-        
+        emoji, risk_level, prediction_text = LATE_RISK_DISPLAY[is_late]
         if reasons:
-            lines.append("**Risk Factors**:")
-            for reason in reasons[:3]:
-                lines.append(f"- {reason}")
+            factors = "**Risk Factors**:\n" + "\n".join(f"- {reason}" for reason in reasons[:3])
         else:
-            lines.append("**Assessment**: Good payment behavior")
+            factors = "**Assessment**: Good payment behavior"
         
-        lines.extend([
-            "",
+        return (
+            f"# Late Payment Risk: {emoji} {risk_level}\n\n"
+            f"**Prediction**: {prediction_text}\n"
+            f"**Risk Score**: {risk_score}/100\n"
+            f"**Risk Probability**: {probability:.1%}\n\n"
+            f"{factors}\n\n"
             "_Model: Rule-based prediction (UC1 fallback)_"
-        ])
-        
-        return "\n".join(lines)
+        )
     
     def _predict_trust_score(self, features: Dict[str, Any]) -> str:
         """UC2: Calculate trust score with business logic."""
@@ -271,24 +448,32 @@ class MLPredictionTool(BaseTool):
             return self._format_error("UC2 model not found", UC2_MODEL_PATH)
         
         try:
-            model = artifact["model"]
-            expected_features = artifact["features"]
-            
-            # Prepare features DataFrame with expected order
-            X = pd.DataFrame([features])
-            
-            # Ensure all required features exist
-            for feat in expected_features:
-                if feat not in X.columns:
-                    X[feat] = 0  # Default missing features
-            
-            X = X[expected_features]
+            # Feature row in expected order, missing features default to 0
+            X = _feature_row(features, artifact["features"])
             
             # Score and decide
-            risk_proba, trust_score, decision = _score_and_decide(model, X)
+            risk_proba, trust_score, decision = _score_and_decide(artifact["model"], X)
             
             # Generate explanation
-            explanation = _explain_score(X.iloc[0])
+            explanation = _explain_score(features)
+            
+            return self._format_trust_score_result(
+                risk_proba, trust_score, decision, explanation
+            )
+        except Exception as e:
+            return f"Error in trust score prediction: {str(e)}"
+    
+    async def _apredict_trust_score(self, features: Dict[str, Any]) -> str:
+        """UC2 trust score, with the model call batched across concurrent requests."""
+        artifact = _load_uc2_model()
+        
+        if artifact is None:
+            return self._format_error("UC2 model not found", UC2_MODEL_PATH)
+        
+        try:
+            X = _feature_row(features, artifact["features"])
+            risk_proba, trust_score, decision = await _ascore_and_decide(artifact["model"], X)
+            explanation = _explain_score(features)
             
             return self._format_trust_score_result(
                 risk_proba, trust_score, decision, explanation
@@ -303,25 +488,15 @@ class MLPredictionTool(BaseTool):
         features: Dict[str, Any]
     ) -> str:
         """Format UC1 late payment prediction as readable text."""
-        is_late = bool(prediction)
-        risk_level = "HIGH" if is_late else "LOW"
-        emoji = "🔴" if is_late else "🟢"
-        
-        lines = [
-            f"# Late Payment Risk: {emoji} {risk_level}",
-            "",
-            f"**Prediction**: {'LIKELY TO BE LATE' if is_late else 'LIKELY ON TIME'}",
-        ]
+        emoji, risk_level, prediction_text = LATE_RISK_DISPLAY[bool(prediction)]
+        probability_line = f"**Risk Probability**: {probability:.1%}\n" if probability is not None else ""
         
-        if probability is not None:
-            lines.append(f"**Risk Probability**: {probability:.1%}")
-        
-        lines.extend([
-            "",
+        return (
+            f"# Late Payment Risk: {emoji} {risk_level}\n\n"
+            f"**Prediction**: {prediction_text}\n"
+            f"{probability_line}\n"
             "_Model: UC1 Late Payment Risk (v1.0)_"
-        ])
-        
-        return "\n".join(lines)
+        )
     
     def _format_trust_score_result(
         self,
@@ -332,35 +507,29 @@ class MLPredictionTool(BaseTool):
     ) -> str:
         """Format UC2 trust score as readable text."""
         # Color-code decision
-        if decision == "APPROVED_3X":
-            emoji = "🟢"
-            decision_text = "APPROVED (3X)"
-        elif decision == "APPROVED_WITH_LIMIT":
-            emoji = "🟡"
-            decision_text = "APPROVED WITH LIMIT"
-        else:
-            emoji = "🔴"
-            decision_text = "REJECTED"
+        emoji, decision_text = DECISION_DISPLAY.get(decision, DECISION_DISPLAY["REJECTED_3X"])
         
-        lines = [
-            f"# Trust Score: {trust_score}/100 {emoji}",
-            "",
-            f"**Decision**: {decision_text}",
-            f"**Risk Probability**: {risk_proba:.1%}",
-            "",
-            f"**Assessment**: {explanation}",
-            "",
+        return (
+            f"# Trust Score: {trust_score}/100 {emoji}\n\n"
+            f"**Decision**: {decision_text}\n"
+            f"**Risk Probability**: {risk_proba:.1%}\n\n"
+            f"**Assessment**: {explanation}\n\n"
             "_Model: UC2 Risk Score (rf_bnpl_v1)_"
-        ]
-        
-        return "\n".join(lines)
+        )
     
     def _format_error(self, message: str, path: Path) -> str:
         """Format error message."""
         return f"⚠️ **Error**: {message}\n\nExpected model at: `{path}`\n\nPlease ensure the ML models are in the correct location."
 
 
+# Singleton tool instance - the tool holds no per-call state
+_ml_tool: Optional[MLPredictionTool] = None
+
+
 # Convenience function for direct import
 def get_ml_tool() -> MLPredictionTool:
-    """Get an instance of the ML prediction tool."""
-    return MLPredictionTool()
+    """Get the shared instance of the ML prediction tool."""
+    global _ml_tool
+    if _ml_tool is None:
+        _ml_tool = MLPredictionTool()
+    return _ml_tool
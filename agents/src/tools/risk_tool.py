@@ -5,12 +5,34 @@ Provides access to ML risk scores for users and orders.
 This is an optional tool that integrates with the ML layer.
 """
 
-import asyncio
+import random
+import zlib
 from typing import Optional, Literal
 from pydantic import BaseModel, Field
 from langchain_core.tools import BaseTool
 
-from .mcp_client import get_mcp_client, MCPResponse
+from .mcp_client import MOCK_FALLBACK, get_mcp_client, resilient_call, MCPResponse
+
+
+# Color-code for each risk band
+BAND_EMOJI = {
+    "low": "🟢",
+    "medium": "🟡",
+    "high": "🟠",
+    "very_high": "🔴",
+}
+
+# Reasons attached to mock scores
+MOCK_REASONS = (
+    "High late payment rate in last 90 days",
+    "Multiple device changes detected",
+    "New account (less than 30 days)",
+    "Previous dispute history",
+    "High-risk merchant category",
+    "Large order amount relative to history",
+    "Unusual transaction pattern",
+    "Low on-time payment rate",
+)
 
 
 class RiskScore(BaseModel):
@@ -65,8 +87,23 @@ class RiskTool(BaseTool):
         entity_type: Literal["user", "order"],
         entity_id: str,
     ) -> str:
-        """Synchronous risk scoring."""
-        return asyncio.run(self._arun(entity_type, entity_id))
+        """Synchronous risk scoring - blocking MCP call, no event loop."""
+        error = self._validate(entity_type, entity_id)
+        if error:
+            return error
+        
+        # Try MCP first
+        response = get_mcp_client().call_sync("risk.score", {"entity": entity_type, "id": entity_id})
+        if response.success and response.data:
+            return self._format_result(response.data)
+        
+        # Try ML model for user scoring, then fall back to a mock score
+        ml_result = self._get_ml_score(entity_id) if entity_type == "user" else None
+        if ml_result:
+            return self._format_result(ml_result)
+        if not MOCK_FALLBACK:
+            return self._unavailable(entity_type, entity_id, response)
+        return self._format_result(self._get_mock_score(entity_type, entity_id))
     
     async def _arun(
         self,
@@ -78,11 +115,9 @@ class RiskTool(BaseTool):
         
         Priority: MCP -> ML Model -> Mock score
         """
-        if entity_type not in ["user", "order"]:
-            return f"Error: entity_type must be 'user' or 'order', got '{entity_type}'"
-        
-        if not entity_id:
-            return "Error: entity_id is required"
+        error = self._validate(entity_type, entity_id)
+        if error:
+            return error
         
         # Try MCP first
         client = get_mcp_client()
@@ -91,52 +126,58 @@ class RiskTool(BaseTool):
             "id": entity_id,
         }
         
-        response: MCPResponse = await client.call("risk.score", params)
+        response: MCPResponse = await resilient_call(client, "risk.score", params)
         
         if response.success and response.data:
             return self._format_result(response.data)
         
         # Try ML model for user scoring
         if entity_type == "user":
-            ml_result = self._get_ml_score(entity_id)
+            ml_result = await self._aget_ml_score(entity_id)
             if ml_result:
                 return self._format_result(ml_result)
         
+        if not MOCK_FALLBACK:
+            return self._unavailable(entity_type, entity_id, response)
+        
         # Fallback to mock score
         mock_result = self._get_mock_score(entity_type, entity_id)
         return self._format_result(mock_result)
     
+    @staticmethod
+    def _unavailable(entity_type: str, entity_id: str, response: MCPResponse) -> str:
+        """Error message when no risk score source answered and mocks are off."""
+        reason = response.error or "no data from MCP server"
+        return f"Error: risk score unavailable for {entity_type} '{entity_id}' ({reason})"
+    
+    @staticmethod
+    def _validate(entity_type: str, entity_id: str) -> Optional[str]:
+        """Error message for invalid arguments, None if they are fine."""
+        if entity_type not in ["user", "order"]:
+            return f"Error: entity_type must be 'user' or 'order', got '{entity_type}'"
+        
+        if not entity_id:
+            return "Error: entity_id is required"
+        
+        return None
+    
     def _format_result(self, data: dict) -> str:
         """Format risk score as readable text."""
         score = data.get("score", 0)
         band = data.get("band", "unknown")
         reasons = data.get("reasons", [])
         
-        # Color-code band
-        band_emoji = {
-            "low": "🟢",
-            "medium": "🟡", 
-            "high": "🟠",
-            "very_high": "🔴",
-        }
-        
-        lines = [
-            f"# Risk Score: {score:.2f} {band_emoji.get(band, '')} ({band.upper()})",
-            "",
-        ]
-        
         if reasons:
-            lines.append("## Contributing Factors:")
-            for i, reason in enumerate(reasons, 1):
-                lines.append(f"{i}. {reason}")
+            factors = "## Contributing Factors:\n" + "\n".join(
+                f"{i}. {reason}" for i, reason in enumerate(reasons, 1)
+            )
         else:
-            lines.append("No specific risk factors identified.")
+            factors = "No specific risk factors identified."
         
         model_version = data.get("model_version")
-        if model_version:
-            lines.append(f"\n_Model version: {model_version}_")
+        footer = f"\n\n_Model version: {model_version}_" if model_version else ""
         
-        return "\n".join(lines)
+        return f"# Risk Score: {score:.2f} {BAND_EMOJI.get(band, '')} ({band.upper()})\n\n{factors}{footer}"
     
     def _get_mock_score(
         self,
@@ -144,14 +185,9 @@ class RiskTool(BaseTool):
         entity_id: str,
     ) -> dict:
         """Generate mock risk score for demo/testing."""
-        import random
-        import hashlib
-        
-        # Use entity_id hash for consistent mock scores
-        hash_val = int(hashlib.md5(entity_id.encode()).hexdigest()[:8], 16)
-        random.seed(hash_val)
-        
-        score = random.uniform(0, 1)
+        # Use entity_id hash for consistent mock scores (CRC32 - not for security)
+        hash_val = zlib.crc32(entity_id.encode())
+        score = (hash_val & 0xFFFF) / 0xFFFF
         
         if score < 0.3:
             band = "low"
@@ -162,20 +198,10 @@ class RiskTool(BaseTool):
         else:
             band = "very_high"
         
-        # Generate mock reasons based on score
-        all_reasons = [
-            "High late payment rate in last 90 days",
-            "Multiple device changes detected",
-            "New account (less than 30 days)",
-            "Previous dispute history",
-            "High-risk merchant category",
-            "Large order amount relative to history",
-            "Unusual transaction pattern",
-            "Low on-time payment rate",
-        ]
-        
-        num_reasons = min(int(score * 5) + 1, len(all_reasons))
-        reasons = random.sample(all_reasons, num_reasons)
+        # Generate mock reasons based on score; a local generator keeps the
+        # global random state untouched
+        num_reasons = min(int(score * 5) + 1, len(MOCK_REASONS))
+        reasons = random.Random(hash_val).sample(MOCK_REASONS, num_reasons)
         
         return {
             "score": score,
@@ -191,126 +217,170 @@ class RiskTool(BaseTool):
         Returns standardized risk score dict or None if model unavailable.
         """
         try:
-            from .ml_tool import _load_uc2_model, _score_and_decide, _explain_score
-            from .local_data import get_local_data
-            import pandas as pd
-            from datetime import datetime
+            from .ml_tool import _score_and_decide
             
-            artifact = _load_uc2_model()
-            if artifact is None:
+            inputs = self._ml_inputs(user_id)
+            if inputs is None:
                 return None
+            model, X, client_features = inputs
+            return self._ml_result(_score_and_decide(model, X), client_features)
+        except Exception as e:
+            # Silently fall back to mock if ML fails
+            return None
+    
+    async def _aget_ml_score(self, user_id: str) -> Optional[dict]:
+        """Like _get_ml_score, batching the model call with concurrent requests."""
+        try:
+            from .ml_tool import _ascore_and_decide
             
-            model = artifact["model"]
-            features = artifact["features"]
-            
-            # Get real data from local adapter
-            adapter = get_local_data()
-            users = adapter.get_table("users")
-            orders = adapter.get_table("orders")
-            installments = adapter.get_table("installments")
-            disputes = adapter.get_table("disputes")
-            
-            # Defaults if data missing
-            account_age_days = 30
-            kyc_level = 1
-            late_rate = 0.0
-            ontime_rate = 1.0
-            active_plans = 0
-            orders_30d = 0
-            amount_30d = 0.0
-            disputes_90d = 0
+            inputs = self._ml_inputs(user_id)
+            if inputs is None:
+                return None
+            model, X, client_features = inputs
+            return self._ml_result(await _ascore_and_decide(model, X), client_features)
+        except Exception as e:
+            return None
+    
+    def _ml_inputs(self, user_id: str) -> Optional[tuple]:
+        """
+        Build the UC2 feature row of a user from the local silver tables.
+        
+        Returns (model, feature row, feature dict), or None if the model is
+        unavailable.
+        """
+        from .ml_tool import _load_uc2_model, _feature_row
+        from .local_data import get_local_data
+        import numpy as np
+        import pandas as pd
+        from datetime import datetime
+        
+        artifact = _load_uc2_model()
+        if artifact is None:
+            return None
+        
+        model = artifact["model"]
+        features = artifact["features"]
+        
+        # Get real data from local adapter
+        adapter = get_local_data()
+        users = adapter.get_table("users")
+        orders = adapter.get_table("orders")
+        
+        # Defaults if data missing
+        account_age_days = 30
+        kyc_level = 1
+        late_rate = 0.0
+        ontime_rate = 1.0
+        active_plans = 0
+        orders_30d = 0
+        amount_30d = 0.0
+        disputes_90d = 0
+        
+        # Calculate features if user exists
+        user_rows = adapter.get_user_rows("users", user_id)
+        if user_rows is not None and len(user_rows):
+            row = user_rows[0]
             
-            # Calculate features if user exists
-            if users is not None and user_id in users["user_id"].values:
-                user_row = users[users["user_id"] == user_id].iloc[0]
-                
-                # Account Age
-                if "created_at" in user_row:
+            # Account Age
+            if "created_at" in users.columns:
+                created = users["created_at"]
+                if created.dtype.kind == "M":
+                    # Parsed at load - plain datetime64 arithmetic, no parsing
+                    created = created.to_numpy()[row]
+                    if not np.isnat(created):
+                        age = np.datetime64(datetime.now(), "ns") - created
+                        account_age_days = int(age // np.timedelta64(1, "D"))
+                else:
                     try:
-                        created = pd.to_datetime(user_row["created_at"])
-                        account_age_days = (datetime.now() - created).days
+                        account_age_days = (datetime.now() - pd.to_datetime(created.iat[row])).days
                     except:
                         pass
-                
-                # KYC Level
-                if "kyc_level" in user_row:
-                    try:
-                        kyc_level = int(user_row["kyc_level"])
-                    except:
-                        pass
-            
-            # Calculate Aggregates if we have transaction history
-            if orders is not None:
-                user_orders = orders[orders["user_id"] == user_id]
-                
-                # Orders 30d
-                # (Simplified: assumes all valid dates or uses total count for demo reliability)
-                orders_30d = len(user_orders)
-                amount_30d = user_orders["amount"].sum() if not user_orders.empty else 0
-            
-            if installments is not None:
-                user_inst = installments[installments["user_id"] == user_id]
-                if not user_inst.empty:
-                    total_closed = len(user_inst[user_inst["status"] != "due"])
-                    total_late = len(user_inst[user_inst["status"] == "late"])
-                    if total_closed > 0:
-                        late_rate = total_late / total_closed
-                        ontime_rate = 1.0 - late_rate
-                    
-                    active_plans = len(user_inst[user_inst["status"] == "due"])
-            
-            if disputes is not None:
-                user_disp = disputes[disputes["user_id"] == user_id]
-                disputes_90d = len(user_disp)
-            
-            # Construct Feature Vector
-            client_features = {
-                "account_age_days": account_age_days,
-                "kyc_level_num": kyc_level,
-                "account_status_num": 1, # Default active
-                "late_rate_90d": late_rate,
-                "ontime_rate_90d": ontime_rate,
-                "active_plans": active_plans,
-                "orders_30d": orders_30d,
-                "amount_30d": amount_30d,
-                "disputes_90d": disputes_90d,
-                "refunds_90d": 0, # Default
-                "checkout_abandon_rate_30d": 0.0, # Default
-            }
             
-            # Prepare features DataFrame
-            X = pd.DataFrame([client_features])
-            
-            # Ensure all required features exist
-            for feat in features:
-                if feat not in X.columns:
-                    X[feat] = 0
-            
-            X = X[features]
-            
-            # Get prediction
-            risk_proba, trust_score, decision = _score_and_decide(model, X)
-            explanation = _explain_score(X.iloc[0])
-            
-            # Convert to standardized format
-            if trust_score >= 70:
-                band = "low"
-            elif trust_score >= 40:
-                band = "medium"
-            elif trust_score >= 20:
-                band = "high"
-            else:
-                band = "very_high"
-            
-            return {
-                "score": risk_proba,
-                "band": band,
-                "reasons": explanation.split(" | ") if explanation else [],
-                "model_version": "UC2-rf_bnpl_v1",
-                "trust_score": trust_score,
-                "decision": decision,
-            }
-            
-        except Exception as e:
-            # Silently fall back to mock if ML fails
-            return None
+            # KYC Level
+            if "kyc_level" in users.columns:
+                try:
+                    kyc_level = int(users["kyc_level"].iat[row])
+                except:
+                    pass
+        
+        # Calculate Aggregates if we have transaction history
+        order_rows = adapter.get_user_rows("orders", user_id)
+        if order_rows is not None:
+            # Orders 30d
+            # (Simplified: assumes all valid dates or uses total count for demo reliability)
+            orders_30d = len(order_rows)
+            amount_30d = orders["amount"].to_numpy()[order_rows].sum() if len(order_rows) else 0
+        
+        inst_rows = adapter.get_user_rows("installments", user_id)
+        if inst_rows is not None and len(inst_rows):
+            status_counts = adapter.count_statuses("installments", inst_rows)
+            active_plans = status_counts.get("due", 0)
+            # Anything not due is closed, including a missing status
+            total_closed = len(inst_rows) - active_plans
+            total_late = status_counts.get("late", 0)
+            if total_closed > 0:
+                late_rate = total_late / total_closed
+                ontime_rate = 1.0 - late_rate
+        
+        dispute_rows = adapter.get_user_rows("disputes", user_id)
+        if dispute_rows is not None:
+            disputes_90d = len(dispute_rows)
+        
+        # Construct Feature Vector
+        client_features = {
+            "account_age_days": account_age_days,
+            "kyc_level_num": kyc_level,
+            "account_status_num": 1, # Default active
+            "late_rate_90d": late_rate,
+            "ontime_rate_90d": ontime_rate,
+            "active_plans": active_plans,
+            "orders_30d": orders_30d,
+            "amount_30d": amount_30d,
+            "disputes_90d": disputes_90d,
+            "refunds_90d": 0, # Default
+            "checkout_abandon_rate_30d": 0.0, # Default
+        }
+        
+        # Feature row in model order, missing features default to 0
+        X = _feature_row(client_features, features)
+        
+        return model, X, client_features
+    
+    @staticmethod
+    def _ml_result(scored: tuple, client_features: dict) -> dict:
+        """Standardized risk score dict from a UC2 (risk_proba, trust_score, decision)."""
+        from .ml_tool import _explain_score
+        
+        risk_proba, trust_score, decision = scored
+        explanation = _explain_score(client_features)
+        
+        # Convert to standardized format
+        if trust_score >= 70:
+            band = "low"
+        elif trust_score >= 40:
+            band = "medium"
+        elif trust_score >= 20:
+            band = "high"
+        else:
+            band = "very_high"
+        
+        return {
+            "score": risk_proba,
+            "band": band,
+            "reasons": explanation.split(" | ") if explanation else [],
+            "model_version": "UC2-rf_bnpl_v1",
+            "trust_score": trust_score,
+            "decision": decision,
+        }
+
+
+# Singleton tool instance - the tool holds no per-call state
+_risk_tool: Optional[RiskTool] = None
+
+
+def get_risk_tool() -> RiskTool:
+    """Get the shared instance of the risk tool."""
+    global _risk_tool
+    if _risk_tool is None:
+        _risk_tool = RiskTool()
+    return _risk_tool
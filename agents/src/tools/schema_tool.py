@@ -5,12 +5,124 @@ Provides access to available tables, columns, and relationships
 from the BNPL data warehouse Silver/Gold layers.
 """
 
-import asyncio
-from typing import Optional, List
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, FrozenSet, Optional, List, Tuple
 from pydantic import BaseModel, Field
 from langchain_core.tools import BaseTool
 
-from .mcp_client import get_mcp_client, MCPResponse
+from ._loop import run_sync
+from .mcp_client import get_mcp_client, resilient_call, MCPResponse
+
+
+# Formatted schema.get results by table filter, with their expiry time
+# (monotonic seconds). Schemas change on the order of hours, so agent steps
+# that look the schema up before each SQL query are served from memory.
+_SCHEMA_CACHE_TTL = 3600.0
+_SCHEMA_CACHE_SIZE = 64
+_schema_cache: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+# Sync calls run on the background loop while async callers may bring their
+# own loops (threads), so the cache is only touched under this lock
+_schema_lock = threading.Lock()
+
+
+# Default schema based on repository documentation
+_DEFAULT_SCHEMA: dict = {
+    "gold": {
+        "kpi_daily": {
+            "columns": ["date", "gmv", "approval_rate", "late_rate", "dispute_rate", "net_margin"],
+            "description": "Daily aggregated KPIs"
+        },
+        "user_features_daily": {
+            "columns": ["user_id", "date", "on_time_rate_30d", "on_time_rate_90d", 
+                       "late_days_sum_30d", "late_days_sum_90d", "installment_count_90d",
+                       "avg_installment_amount_30d", "device_change_count_30d", 
+                       "dispute_rate_90d", "account_age_days"],
+            "description": "User-level features (one row per user per day)"
+        },
+        "merchant_features_daily": {
+            "columns": ["merchant_id", "date", "approval_rate_30d", "late_rate_30d",
+                       "dispute_rate_30d", "refund_rate_30d", "order_count_30d", "gmv_30d"],
+            "description": "Merchant-level features (one row per merchant per day)"
+        },
+        "cohorts_signup_week": {
+            "columns": ["signup_week", "user_count", "late_rate_30d", "avg_order_amount"],
+            "description": "User cohort analysis by signup week"
+        }
+    },
+    "silver": {
+        "users": {
+            "columns": ["user_id", "signup_date", "kyc_level", "city", 
+                       "device_fingerprint", "account_status"],
+            "description": "User master data"
+        },
+        "merchants": {
+            "columns": ["merchant_id", "merchant_name", "category", "city", "risk_tier"],
+            "description": "Merchant master data"
+        },
+        "orders": {
+            "columns": ["order_id", "user_id", "merchant_id", "amount", 
+                       "currency", "status", "created_at"],
+            "description": "BNPL orders"
+        },
+        "installments": {
+            "columns": ["installment_id", "order_id", "due_date", "paid_date", 
+                       "status", "late_days"],
+            "description": "Payment installments"
+        },
+        "payments": {
+            "columns": ["payment_id", "installment_id", "amount", 
+                       "payment_channel", "paid_at"],
+            "description": "Actual payments made"
+        },
+        "disputes_returns": {
+            "columns": ["case_id", "order_id", "reason", "amount", "outcome"],
+            "description": "Disputes and refunds"
+        }
+    }
+}
+
+# Lookups over the default schema, built once instead of walking it per call
+# (SQLTool checks the table allowlist on every query)
+_ALLOWED_TABLES: Tuple[str, ...] = tuple(
+    table for layer in _DEFAULT_SCHEMA.values() for table in layer
+)
+_ALLOWED_TABLE_SET: FrozenSet[str] = frozenset(_ALLOWED_TABLES)
+_TABLE_COLUMNS: Dict[str, List[str]] = {
+    table: info.get("columns", [])
+    for layer in _DEFAULT_SCHEMA.values()
+    for table, info in layer.items()
+}
+
+
+@lru_cache(maxsize=32)
+def _format_default_schema(table_name: Optional[str] = None) -> str:
+    """
+    Format the default schema as readable text.
+
+    The schema is static, so each rendering (full or per table) is built
+    once; MCP outages otherwise re-render it on every schema lookup.
+    """
+    lines = ["# Available Schema (from configuration)\n"]
+    
+    for layer, tables in _DEFAULT_SCHEMA.items():
+        if table_name and table_name not in tables:
+            continue
+            
+        lines.append(f"## {layer.upper()} Layer\n")
+        
+        for tbl_name, info in tables.items():
+            if table_name and tbl_name != table_name:
+                continue
+                
+            lines.append(f"### {tbl_name}")
+            lines.append(f"{info.get('description', '')}")
+            lines.append("Columns: " + ", ".join(info.get("columns", [])))
+            lines.append("")
+    
+    return "\n".join(lines)
 
 
 class SchemaInfo(BaseModel):
@@ -61,65 +173,11 @@ class SchemaTool(BaseTool):
     - orders, installments, payments, users, merchants, disputes_returns
     """
     
-    # Default schema based on repository documentation
-    _default_schema: dict = {
-        "gold": {
-            "kpi_daily": {
-                "columns": ["date", "gmv", "approval_rate", "late_rate", "dispute_rate", "net_margin"],
-                "description": "Daily aggregated KPIs"
-            },
-            "user_features_daily": {
-                "columns": ["user_id", "date", "on_time_rate_30d", "on_time_rate_90d", 
-                           "late_days_sum_30d", "late_days_sum_90d", "installment_count_90d",
-                           "avg_installment_amount_30d", "device_change_count_30d", 
-                           "dispute_rate_90d", "account_age_days"],
-                "description": "User-level features (one row per user per day)"
-            },
-            "merchant_features_daily": {
-                "columns": ["merchant_id", "date", "approval_rate_30d", "late_rate_30d",
-                           "dispute_rate_30d", "refund_rate_30d", "order_count_30d", "gmv_30d"],
-                "description": "Merchant-level features (one row per merchant per day)"
-            },
-            "cohorts_signup_week": {
-                "columns": ["signup_week", "user_count", "late_rate_30d", "avg_order_amount"],
-                "description": "User cohort analysis by signup week"
-            }
-        },
-        "silver": {
-            "users": {
-                "columns": ["user_id", "signup_date", "kyc_level", "city", 
-                           "device_fingerprint", "account_status"],
-                "description": "User master data"
-            },
-            "merchants": {
-                "columns": ["merchant_id", "merchant_name", "category", "city", "risk_tier"],
-                "description": "Merchant master data"
-            },
-            "orders": {
-                "columns": ["order_id", "user_id", "merchant_id", "amount", 
-                           "currency", "status", "created_at"],
-                "description": "BNPL orders"
-            },
-            "installments": {
-                "columns": ["installment_id", "order_id", "due_date", "paid_date", 
-                           "status", "late_days"],
-                "description": "Payment installments"
-            },
-            "payments": {
-                "columns": ["payment_id", "installment_id", "amount", 
-                           "payment_channel", "paid_at"],
-                "description": "Actual payments made"
-            },
-            "disputes_returns": {
-                "columns": ["case_id", "order_id", "reason", "amount", "outcome"],
-                "description": "Disputes and refunds"
-            }
-        }
-    }
+    _default_schema: dict = _DEFAULT_SCHEMA
     
     def _run(self, table_name: Optional[str] = None) -> str:
         """Synchronous schema fetch."""
-        return asyncio.run(self._arun(table_name))
+        return run_sync(self._arun(table_name))
     
     async def _arun(self, table_name: Optional[str] = None) -> str:
         """
@@ -127,16 +185,33 @@ class SchemaTool(BaseTool):
         
         Falls back to default schema if MCP is unavailable.
         """
+        key = table_name or "*"
+        with _schema_lock:
+            cached = _schema_cache.get(key)
+            if cached is not None:
+                expires_at, text = cached
+                if time.monotonic() < expires_at:
+                    _schema_cache.move_to_end(key)
+                    return text
+                del _schema_cache[key]
+        
         client = get_mcp_client()
         
         params = {}
         if table_name:
             params["table_name"] = table_name
         
-        response: MCPResponse = await client.call("schema.get", params)
+        response: MCPResponse = await resilient_call(client, "schema.get", params)
         
         if response.success and response.data:
-            return self._format_schema(response.data, table_name)
+            text = self._format_schema(response.data, table_name)
+            # Only server schemas are cached, so an unavailable server is retried
+            with _schema_lock:
+                _schema_cache[key] = (time.monotonic() + _SCHEMA_CACHE_TTL, text)
+                _schema_cache.move_to_end(key)
+                if len(_schema_cache) > _SCHEMA_CACHE_SIZE:
+                    _schema_cache.popitem(last=False)
+            return text
         
         # Fallback to default schema
         return self._format_default_schema(table_name)
@@ -153,45 +228,39 @@ class SchemaTool(BaseTool):
             lines.append(f"## {table.get('name', 'Unknown')}")
             lines.append(f"Description: {table.get('description', 'N/A')}")
             lines.append("Columns:")
-            for col in table.get("columns", []):
-                col_name = col.get("name", "")
-                col_type = col.get("type", "")
-                lines.append(f"  - {col_name} ({col_type})")
+            lines.extend(
+                f"  - {col.get('name', '')} ({col.get('type', '')})"
+                for col in table.get("columns", [])
+            )
             lines.append("")
         
         return "\n".join(lines)
     
     def _format_default_schema(self, table_name: Optional[str] = None) -> str:
         """Format default schema as readable text."""
-        lines = ["# Available Schema (from configuration)\n"]
-        
-        for layer, tables in self._default_schema.items():
-            if table_name and table_name not in tables:
-                continue
-                
-            lines.append(f"## {layer.upper()} Layer\n")
-            
-            for tbl_name, info in tables.items():
-                if table_name and tbl_name != table_name:
-                    continue
-                    
-                lines.append(f"### {tbl_name}")
-                lines.append(f"{info.get('description', '')}")
-                lines.append("Columns: " + ", ".join(info.get("columns", [])))
-                lines.append("")
-        
-        return "\n".join(lines)
+        return _format_default_schema(table_name)
     
     def get_allowed_tables(self) -> List[str]:
         """Get list of all allowed table names."""
-        tables = []
-        for layer in self._default_schema.values():
-            tables.extend(layer.keys())
-        return tables
+        return list(_ALLOWED_TABLES)
+    
+    def get_allowed_table_set(self) -> FrozenSet[str]:
+        """Get allowed table names as a set, for membership checks."""
+        return _ALLOWED_TABLE_SET
     
     def get_table_columns(self, table_name: str) -> List[str]:
         """Get columns for a specific table."""
-        for layer in self._default_schema.values():
-            if table_name in layer:
-                return layer[table_name].get("columns", [])
-        return []
+        return list(_TABLE_COLUMNS.get(table_name, []))
+
+
+# Singleton tool instance - SQLTool instances validate against it instead of
+# each building (and deep-copying the default schema into) their own
+_schema_tool: Optional[SchemaTool] = None
+
+
+def get_schema_tool() -> SchemaTool:
+    """Get the shared instance of the schema tool."""
+    global _schema_tool
+    if _schema_tool is None:
+        _schema_tool = SchemaTool()
+    return _schema_tool
@@ -8,16 +8,60 @@ Provides safe SQL execution with mandatory guardrails:
 - Table allowlist enforcement
 """
 
-import asyncio
 import re
 from datetime import datetime, timedelta
-from typing import Optional, List, Set
+from functools import lru_cache
+from operator import itemgetter
+from typing import Optional, List, Set, Tuple
 import os
 from pydantic import BaseModel, Field
 from langchain_core.tools import BaseTool
 
-from .mcp_client import get_mcp_client, MCPResponse
-from .schema_tool import SchemaTool
+from ._loop import run_sync
+from .mcp_client import MOCK_FALLBACK, get_mcp_client, resilient_call, MCPResponse
+from .schema_tool import SchemaTool, get_schema_tool
+
+try:
+    import sqlglot
+    from sqlglot import exp
+    from sqlglot.optimizer.scope import traverse_scope
+except ImportError:  # Optional - falls back to regex FROM/JOIN extraction
+    sqlglot = None
+
+
+# Guardrail regexes, compiled once at import instead of per validated query
+_FROM_RE = re.compile(r'\bFROM\s+(\w+)', re.IGNORECASE)
+_JOIN_RE = re.compile(r'\bJOIN\s+(\w+)', re.IGNORECASE)
+# A date column compared or ranged, or an ISO date literal, after a WHERE -
+# the three alternatives share one scan of the query
+_TIME_FILTER_RE = re.compile(
+    r"WHERE.*(?:"
+    r"\b(date|created_at|paid_at|due_date|signup_date)\b.*[>=<]"
+    r"|\b(date|created_at)\b.*BETWEEN"
+    r"|\b\d{4}-\d{2}-\d{2}\b"  # ISO date format
+    r")",
+    re.IGNORECASE,
+)
+_WHERE_RE = re.compile(r'\bWHERE\b', re.IGNORECASE)
+_CLAUSE_RE = re.compile(r'\b(GROUP BY|ORDER BY|LIMIT)\b', re.IGNORECASE)
+_LIMIT_RE = re.compile(r'\bLIMIT\s+(\d+)', re.IGNORECASE)
+# Schemas a qualified table name may live in (e.g. silver.orders)
+_ALLOWED_SCHEMAS = frozenset({"silver", "gold"})
+
+
+@lru_cache(maxsize=32)
+def _blocked_union(patterns: Tuple[str, ...]) -> "re.Pattern[str]":
+    """
+    Fuse the guardrail blocked patterns into one alternation.
+    
+    Each pattern gets its own named group (b0, b1, ...) so a match can be
+    traced back to the pattern that fired, and the query is scanned once
+    instead of once per pattern.
+    """
+    return re.compile(
+        "|".join(f"(?P<b{i}>{p})" for i, p in enumerate(patterns)),
+        re.IGNORECASE,
+    )
 
 
 class SQLGuardrails(BaseModel):
@@ -100,7 +144,7 @@ class SQLTool(BaseTool):
     
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self._schema_tool = SchemaTool()
+        self._schema_tool = get_schema_tool()
         
         # Load config from env
         max_rows = os.getenv("MAX_SQL_ROWS")
@@ -113,7 +157,7 @@ class SQLTool(BaseTool):
     
     def _run(self, query: str, limit: Optional[int] = None) -> str:
         """Synchronous SQL execution."""
-        return asyncio.run(self._arun(query, limit))
+        return run_sync(self._arun(query, limit))
     
     async def _arun(self, query: str, limit: Optional[int] = None) -> str:
         """
@@ -142,7 +186,7 @@ class SQLTool(BaseTool):
 
         # Execute via MCP
         client = get_mcp_client()
-        response: MCPResponse = await client.call("sql.run", {"query": validation.query})
+        response: MCPResponse = await resilient_call(client, "sql.run", {"query": validation.query})
         
         if response.success and response.data:
             return warnings_text + self._format_results(response.data)
@@ -150,6 +194,9 @@ class SQLTool(BaseTool):
         if response.error:
             return warnings_text + f"SQL Execution Error: {response.error}"
         
+        if not MOCK_FALLBACK:
+            return warnings_text + self._format_results({})
+        
         # Fallback to mock execution for demo
         mock_result = self._mock_execute(validation.query)
         return warnings_text + mock_result
@@ -204,14 +251,17 @@ class SQLTool(BaseTool):
         modified_query = query.strip()
         
         # 1. Check it's a SELECT query
-        if not modified_query.upper().startswith("SELECT"):
+        if modified_query[:6].upper() != "SELECT":
             errors.append("Only SELECT queries are allowed. Query must start with SELECT.")
             return SQLValidationResult(is_valid=False, query=query, errors=errors)
         
         # 2. Check for blocked patterns
-        for pattern in self.guardrails.blocked_patterns:
-            if re.search(pattern, modified_query, re.IGNORECASE):
-                errors.append(f"Blocked SQL pattern detected: {pattern}")
+        patterns = tuple(self.guardrails.blocked_patterns)
+        if patterns:
+            hits = {m.lastgroup for m in _blocked_union(patterns).finditer(modified_query)}
+            for i, pattern in enumerate(patterns):
+                if f"b{i}" in hits:
+                    errors.append(f"Blocked SQL pattern detected: {pattern}")
         
         if errors:
             return SQLValidationResult(is_valid=False, query=query, errors=errors)
@@ -246,20 +296,9 @@ class SQLTool(BaseTool):
     def _validate_tables(self, query: str) -> List[str]:
         """Extract and validate tables from query."""
         errors = []
-        allowed_tables = set(self._schema_tool.get_allowed_tables())
-        
-        # Simple table extraction (FROM and JOIN clauses)
-        # This is a simplified approach - production would use SQL parser
-        from_pattern = r'\bFROM\s+(\w+)'
-        join_pattern = r'\bJOIN\s+(\w+)'
+        allowed_tables = self._schema_tool.get_allowed_table_set()
         
-        tables_in_query: Set[str] = set()
-        
-        for match in re.finditer(from_pattern, query, re.IGNORECASE):
-            tables_in_query.add(match.group(1).lower())
-        
-        for match in re.finditer(join_pattern, query, re.IGNORECASE):
-            tables_in_query.add(match.group(1).lower())
+        tables_in_query = self._extract_tables(query)
         
         # Check against allowlist
         for table in tables_in_query:
@@ -268,34 +307,65 @@ class SQLTool(BaseTool):
         
         return errors
     
+    @staticmethod
+    def _extract_tables(query: str) -> Set[str]:
+        """Table names referenced by the query, lowercased."""
+        if sqlglot is not None:
+            try:
+                tree = sqlglot.parse_one(query)
+                scopes = traverse_scope(tree)
+            except sqlglot.errors.SqlglotError:
+                tree = None
+            if tree is not None:
+                # An unqualified name only refers to a CTE when one of that
+                # name is visible from its own scope
+                ctes = set()
+                for scope in scopes:
+                    ctes.update(
+                        id(t) for t in scope.tables
+                        if not t.db and not t.catalog and t.name in scope.cte_sources
+                    )
+                
+                # Tables in subqueries and quoted identifiers count; a schema
+                # or catalog qualifier outside silver/gold is reported itself
+                tables_in_query = set()
+                for t in tree.find_all(exp.Table):
+                    if id(t) in ctes:
+                        continue
+                    for qualifier in (t.catalog, t.db):
+                        if qualifier and qualifier.lower() not in _ALLOWED_SCHEMAS:
+                            tables_in_query.add(qualifier.lower())
+                    tables_in_query.add(t.name.lower())
+                return tables_in_query
+        
+        # Simple table extraction (FROM and JOIN clauses)
+        tables_in_query: Set[str] = set()
+        
+        for match in _FROM_RE.finditer(query):
+            tables_in_query.add(match.group(1).lower())
+        
+        for match in _JOIN_RE.finditer(query):
+            tables_in_query.add(match.group(1).lower())
+        
+        return tables_in_query
+    
     def _has_time_filter(self, query: str) -> bool:
         """Check if query has a time/date filter."""
-        time_patterns = [
-            r"WHERE.*\b(date|created_at|paid_at|due_date|signup_date)\b.*[>=<]",
-            r"WHERE.*\b(date|created_at)\b.*BETWEEN",
-            r"WHERE.*\b\d{4}-\d{2}-\d{2}\b",  # ISO date format
-        ]
-        
-        for pattern in time_patterns:
-            if re.search(pattern, query, re.IGNORECASE):
-                return True
-        return False
+        return _TIME_FILTER_RE.search(query) is not None
     
     def _add_time_filter(self, query: str, start_date: str) -> str:
         """Add time filter to query."""
         # Find WHERE clause or add one
-        if re.search(r'\bWHERE\b', query, re.IGNORECASE):
+        if _WHERE_RE.search(query):
             # Add to existing WHERE
-            query = re.sub(
-                r'(\bWHERE\b)',
+            query = _WHERE_RE.sub(
                 f"WHERE created_at >= '{start_date}' AND",
                 query,
                 count=1,
-                flags=re.IGNORECASE,
             )
         else:
             # Find position to insert WHERE (before GROUP BY, ORDER BY, or LIMIT)
-            insert_match = re.search(r'\b(GROUP BY|ORDER BY|LIMIT)\b', query, re.IGNORECASE)
+            insert_match = _CLAUSE_RE.search(query)
             if insert_match:
                 insert_pos = insert_match.start()
                 query = query[:insert_pos] + f" WHERE created_at >= '{start_date}' " + query[insert_pos:]
@@ -308,18 +378,13 @@ class SQLTool(BaseTool):
     def _ensure_limit(self, query: str, limit: int) -> str:
         """Ensure query has a LIMIT clause."""
         # Check for existing LIMIT
-        limit_match = re.search(r'\bLIMIT\s+(\d+)', query, re.IGNORECASE)
+        limit_match = _LIMIT_RE.search(query)
         
         if limit_match:
             existing_limit = int(limit_match.group(1))
             if existing_limit > limit:
                 # Replace with lower limit
-                query = re.sub(
-                    r'\bLIMIT\s+\d+',
-                    f"LIMIT {limit}",
-                    query,
-                    flags=re.IGNORECASE,
-                )
+                query = _LIMIT_RE.sub(f"LIMIT {limit}", query)
         else:
             # Add LIMIT
             query = query.rstrip(";") + f" LIMIT {limit}"
@@ -338,15 +403,22 @@ class SQLTool(BaseTool):
         
         # Build markdown table
         if columns:
-            lines.append("| " + " | ".join(str(c) for c in columns) + " |")
-            lines.append("| " + " | ".join("---" for _ in columns) + " |")
+            lines.append(f"| {' | '.join(map(str, columns))} |")
+            lines.append(f"|{' --- |' * len(columns)}")
+        
+        # One C-level lookup of all columns per dict row instead of a .get()
+        # call per cell; rows missing a column fall back to the per-cell path
+        get_values = itemgetter(*columns) if len(columns) > 1 else None
         
         for row in rows[:50]:  # Limit display to 50 rows
             if isinstance(row, dict):
-                values = [str(row.get(c, "")) for c in columns]
+                try:
+                    values = [str(v) for v in get_values(row)]
+                except (KeyError, TypeError):  # missing column, or < 2 columns
+                    values = [str(row.get(c, "")) for c in columns]
             else:
                 values = [str(v) for v in row]
-            lines.append("| " + " | ".join(values) + " |")
+            lines.append(f"| {' | '.join(values)} |")
         
         if len(rows) > 50:
             lines.append(f"\n... and {len(rows) - 50} more rows (truncated for display)")
@@ -6,17 +6,209 @@ enabling debugging, evaluation, and monitoring.
 """
 
 import asyncio
+import atexit
+import json
+import logging
 import os
-from datetime import datetime
-from typing import Optional, Any
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from typing import List, Optional, Any, Set
 from pydantic import BaseModel, Field
 from langchain_core.tools import BaseTool
 
-from .mcp_client import get_mcp_client, MCPResponse
+from . import _loop
+from ._loop import _get_loop_thread
+from .mcp_client import get_mcp_client
+
+try:
+    import orjson
+except ImportError:  # Optional - falls back to the stdlib json module
+    orjson = None
+
+logger = logging.getLogger("bnpl_agent.trace")
+
+
+# Sampling, read once: keep TRACE_SAMPLE_RATE of events (0-1) and drop the
+# event types in TRACE_DROP_EVENTS (comma-separated). Errors are always kept.
+_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+_DROP_EVENTS = frozenset(
+    e.strip() for e in os.getenv("TRACE_DROP_EVENTS", "").split(",") if e.strip()
+)
+
+
+def _sampled_out(event_type: str, error: Optional[str]) -> bool:
+    """Whether an event is dropped before any payload is built."""
+    if error is not None or event_type == "error":
+        return False
+    return event_type in _DROP_EVENTS or (
+        _SAMPLE_RATE < 1.0 and random.random() >= _SAMPLE_RATE
+    )
+
+
+# Traces don't affect results, so tools hand them to the shared background
+# loop (tools/_loop.py) and return: the caller's side is one thread-safe
+# callback, and batching, serialization and MCP I/O all happen on that loop.
+# The state below is only touched from the loop's thread.
+
+# Traces are sent to MCP in JSON-RPC batches: a batch goes out once it holds
+# _TRACE_BATCH_SIZE traces or _TRACE_BATCH_MAX_WAIT after its first trace
+_TRACE_BATCH_SIZE = 32
+_TRACE_BATCH_MAX_WAIT = 0.1  # seconds
+# Traces waiting or being sent beyond this are dropped (and counted) rather
+# than piling up behind a slow MCP server
+_MAX_QUEUED_TRACES = 4096
+
+_trace_batch: List[dict] = []
+_queued_traces = 0
+dropped_traces = 0
+# Batch submissions in flight, kept referenced until they finish
+_pending: Set[asyncio.Task] = set()
+_drain_registered = False
+
+
+# Langfuse client shared by all TraceTool instances (None when not
+# configured): one import, connection pool and event queue per process
+_langfuse_client: Optional[Any] = None
+_langfuse_loaded = False
+_langfuse_lock = threading.Lock()
+
+
+def _get_langfuse_client() -> Optional[Any]:
+    """Get the shared Langfuse client, creating it on first use."""
+    global _langfuse_client, _langfuse_loaded
+    if not _langfuse_loaded:
+        with _langfuse_lock:
+            if not _langfuse_loaded:
+                _langfuse_client = _create_langfuse_client()
+                _langfuse_loaded = True
+    return _langfuse_client
+
+
+def _create_langfuse_client() -> Optional[Any]:
+    """Create a Langfuse client if configured and installed."""
+    public_key = os.getenv("LANGFUSE_PUBLIC_KEY")
+    secret_key = os.getenv("LANGFUSE_SECRET_KEY")
+    
+    if not (public_key and secret_key):
+        return None
+    try:
+        from langfuse import Langfuse
+    except ImportError:
+        return None
+    
+    return Langfuse(
+        public_key=public_key,
+        secret_key=secret_key,
+        host=os.getenv("LANGFUSE_HOST", "https://cloud.langfuse.com"),
+        # Send events in bigger, less frequent batches
+        flush_at=50,
+        flush_interval=10.0,
+    )
+
+
+def _iso_timestamp(ts: float) -> str:
+    """Event time (epoch seconds) as naive UTC ISO 8601, the wire format."""
+    return datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None).isoformat()
+
+
+def _flush_traces() -> None:
+    """Start sending the pending trace batch."""
+    global _trace_batch
+    batch, _trace_batch = _trace_batch, []
+    if not batch:
+        return
+    task = asyncio.get_running_loop().create_task(_send_traces(batch))
+    _pending.add(task)
+    task.add_done_callback(_pending.discard)
+
+
+async def _send_traces(payloads: List[dict]):
+    """Send traces to MCP in one request, logging failed ones locally."""
+    global _queued_traces
+    try:
+        client = get_mcp_client()
+        requests = [
+            ("trace.log", {**payload, "timestamp": _iso_timestamp(payload["timestamp"])})
+            for payload in payloads
+        ]
+        if len(requests) == 1:
+            responses = [await client.call(*requests[0])]
+        else:
+            responses = await client.call_many(requests)
+        
+        for payload, response in zip(payloads, responses):
+            if not response.success:
+                TraceTool._log_locally(payload)
+    finally:
+        _queued_traces -= len(payloads)
+
+
+def _queue_trace(payload: dict) -> None:
+    """Add a trace to the batch, starting the batch timer (on the loop)."""
+    global _queued_traces, dropped_traces
+    if _queued_traces >= _MAX_QUEUED_TRACES:
+        dropped_traces += 1
+        if dropped_traces == 1:
+            logger.warning("Trace queue full (%d events); dropping traces", _MAX_QUEUED_TRACES)
+        return
+    _queued_traces += 1
+    
+    _trace_batch.append(payload)
+    if len(_trace_batch) >= _TRACE_BATCH_SIZE:
+        _flush_traces()
+    elif len(_trace_batch) == 1:
+        asyncio.get_running_loop().call_later(_TRACE_BATCH_MAX_WAIT, _flush_traces)
+
+
+def _submit_trace(payload: dict) -> None:
+    """Hand a trace to the background loop, from any thread or loop."""
+    # Registered before handing off, so a trace queued right before exit
+    # is drained
+    _register_drain()
+    _get_loop_thread().loop.call_soon_threadsafe(_queue_trace, payload)
+
+
+async def _flush_and_wait(timeout: float):
+    """Send the pending batch and wait for all submissions in flight."""
+    _flush_traces()
+    if _pending:
+        await asyncio.wait(list(_pending), timeout=timeout)
+
+
+def _register_drain():
+    """Drain pending traces at exit, before the MCP client is closed."""
+    global _drain_registered
+    if not _drain_registered:
+        # atexit runs hooks last-in first-out: make sure the client's close
+        # hook is registered first
+        get_mcp_client()
+        atexit.register(_drain_pending)
+        _drain_registered = True
+
+
+def _drain_pending(timeout: float = 2.0):
+    """Give trace submissions still in flight a bounded wait at exit."""
+    thread = _loop._loop_thread
+    if thread is None or not thread.loop.is_running():
+        return
+    try:
+        # Scheduled after any _queue_trace callbacks still waiting to run
+        asyncio.run_coroutine_threadsafe(
+            _flush_and_wait(timeout), thread.loop
+        ).result(timeout + 0.5)
+    except Exception:
+        pass
 
 
 class TracePayload(BaseModel):
-    """Payload for trace logging."""
+    """
+    Payload for trace logging.
+    
+    Documents the trace event shape; TraceTool builds events as plain
+    dicts with these keys (None fields left out).
+    """
     
     event_type: str
     user_query: Optional[str] = None
@@ -27,7 +219,8 @@ class TracePayload(BaseModel):
     latency_ms: Optional[float] = None
     error: Optional[str] = None
     metadata: dict = Field(default_factory=dict)
-    timestamp: str = Field(default_factory=lambda: datetime.utcnow().isoformat())
+    # Epoch seconds; sent and logged as UTC ISO 8601
+    timestamp: float = Field(default_factory=time.time)
 
 
 class TraceTool(BaseTool):
@@ -82,22 +275,9 @@ class TraceTool(BaseTool):
         self._init_langfuse()
     
     def _init_langfuse(self):
-        """Initialize Langfuse client if configured."""
-        public_key = os.getenv("LANGFUSE_PUBLIC_KEY")
-        secret_key = os.getenv("LANGFUSE_SECRET_KEY")
-        
-        if public_key and secret_key:
-            try:
-                from langfuse import Langfuse
-                
-                self._langfuse_client = Langfuse(
-                    public_key=public_key,
-                    secret_key=secret_key,
-                    host=os.getenv("LANGFUSE_HOST", "https://cloud.langfuse.com"),
-                )
-                self._langfuse_available = True
-            except ImportError:
-                pass
+        """Use the shared Langfuse client if configured."""
+        self._langfuse_client = _get_langfuse_client()
+        self._langfuse_available = self._langfuse_client is not None
     
     def _run(
         self,
@@ -111,11 +291,20 @@ class TraceTool(BaseTool):
         error: Optional[str] = None,
         metadata: Optional[dict] = None,
     ) -> str:
-        """Synchronous trace logging."""
-        return asyncio.run(self._arun(
-            event_type, user_query, intent, tool_calls, 
+        """Synchronous trace logging - no event loop on the calling thread."""
+        if _sampled_out(event_type, error):
+            return f"Trace skipped: {event_type}"
+        
+        payload = self._build_payload(
+            event_type, user_query, intent, tool_calls,
             sql_query, outputs, latency_ms, error, metadata
-        ))
+        )
+        
+        if self._try_langfuse(payload):
+            return f"Trace logged to Langfuse: {event_type}"
+        
+        _submit_trace(payload)
+        return f"Trace queued: {event_type}"
     
     async def _arun(
         self,
@@ -131,90 +320,120 @@ class TraceTool(BaseTool):
     ) -> str:
         """
         Log trace to MCP/Langfuse.
+        
+        MCP traces are batched and sent in the background; failed ones are
+        logged locally.
         """
-        payload = TracePayload(
-            event_type=event_type,
-            user_query=user_query,
-            intent=intent,
-            tool_calls=tool_calls or [],
-            sql_query=sql_query,
-            outputs=outputs,
-            latency_ms=latency_ms,
-            error=error,
-            metadata=metadata or {},
+        if _sampled_out(event_type, error):
+            return f"Trace skipped: {event_type}"
+        
+        payload = self._build_payload(
+            event_type, user_query, intent, tool_calls,
+            sql_query, outputs, latency_ms, error, metadata
         )
         
-        # Try Langfuse first
+        if self._try_langfuse(payload):
+            return f"Trace logged to Langfuse: {event_type}"
+        
+        # Try MCP, batched and without waiting for it
+        _submit_trace(payload)
+        return f"Trace queued: {event_type}"
+    
+    @staticmethod
+    def _build_payload(
+        event_type: str,
+        user_query: Optional[str],
+        intent: Optional[str],
+        tool_calls: Optional[list],
+        sql_query: Optional[str],
+        outputs: Optional[Any],
+        latency_ms: Optional[float],
+        error: Optional[str],
+        metadata: Optional[dict],
+    ) -> dict:
+        """
+        Build a trace event.
+        
+        A plain dict in TracePayload's shape: no model validation or
+        model_dump per event, and it goes to MCP as-is.
+        """
+        payload = {
+            "event_type": event_type,
+            "tool_calls": tool_calls or [],
+            "metadata": metadata or {},
+            # Formatted only if the event is sent to MCP or logged locally
+            "timestamp": time.time(),
+        }
+        for key, value in (
+            ("user_query", user_query),
+            ("intent", intent),
+            ("sql_query", sql_query),
+            ("outputs", outputs),
+            ("latency_ms", latency_ms),
+            ("error", error),
+        ):
+            if value is not None:
+                payload[key] = value
+        return payload
+    
+    def _try_langfuse(self, payload: dict) -> bool:
+        """Log to Langfuse if configured; False to fall through to MCP."""
         if self._langfuse_available and self._langfuse_client:
             try:
                 self._log_to_langfuse(payload)
-                return f"Trace logged to Langfuse: {event_type}"
-            except Exception as e:
-                # Fall through to MCP
+                return True
+            except Exception:
                 pass
-        
-        # Try MCP
-        client = get_mcp_client()
-        response: MCPResponse = await client.call(
-            "trace.log", 
-            payload.model_dump(exclude_none=True)
-        )
-        
-        if response.success:
-            return f"Trace logged via MCP: {event_type}"
-        
-        # Fallback to local logging
-        self._log_locally(payload)
-        return f"Trace logged locally: {event_type}"
+        return False
     
-    def _log_to_langfuse(self, payload: TracePayload):
+    def _log_to_langfuse(self, payload: dict):
         """Log to Langfuse."""
         if not self._langfuse_client:
             return
         
+        # Output goes in with the trace itself rather than a follow-up update
         trace = self._langfuse_client.trace(
-            name=payload.event_type,
-            input=payload.user_query,
+            name=payload["event_type"],
+            input=payload.get("user_query"),
+            output=payload.get("outputs") or None,
             metadata={
-                "intent": payload.intent,
-                "tool_calls": payload.tool_calls,
-                "sql_query": payload.sql_query,
-                **payload.metadata,
+                "intent": payload.get("intent"),
+                "tool_calls": payload["tool_calls"],
+                "sql_query": payload.get("sql_query"),
+                **payload["metadata"],
             }
         )
         
-        if payload.outputs:
-            trace.update(output=payload.outputs)
-        
-        if payload.error:
+        if payload.get("error"):
             trace.update(
                 level="ERROR",
-                status_message=payload.error,
+                status_message=payload["error"],
             )
         
-        if payload.latency_ms:
+        if payload.get("latency_ms"):
             # Log as generation for latency tracking
             trace.generation(
                 name="execution",
-                metadata={"latency_ms": payload.latency_ms},
+                metadata={"latency_ms": payload["latency_ms"]},
             )
     
-    def _log_locally(self, payload: TracePayload):
+    @staticmethod
+    def _log_locally(payload: dict):
         """Fallback local logging."""
-        import json
-        import logging
-        
-        logger = logging.getLogger("bnpl_agent.trace")
+        level = logging.ERROR if payload.get("error") else logging.INFO
+        if not logger.isEnabledFor(level):
+            return
         
         log_data = {
-            "timestamp": payload.timestamp,
-            "event_type": payload.event_type,
-            "intent": payload.intent,
-            "latency_ms": payload.latency_ms,
-            "error": payload.error,
+            "timestamp": _iso_timestamp(payload["timestamp"]),
+            "event_type": payload["event_type"],
+            "intent": payload.get("intent"),
+            "latency_ms": payload.get("latency_ms"),
+            "error": payload.get("error"),
         }
         
-        if payload.error:
-            logger.error(json.dumps(log_data))
+        if orjson is not None:
+            line = orjson.dumps(log_data).decode()
         else:
-            logger.info(json.dumps(log_data))
+            line = json.dumps(log_data)
+        logger.log(level, line)
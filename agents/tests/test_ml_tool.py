@@ -78,6 +78,20 @@ class TestMLPredictionTool:
         
         assert "Error" in result
         assert "Unknown prediction_type" in result
+    
+    def test_sync_run_inside_event_loop(self, ml_tool):
+        """Test sync `_run` works when called from a running event loop."""
+        import asyncio
+        
+        async def call_sync():
+            return ml_tool._run(prediction_type="invalid_type", features={})
+        
+        assert "Unknown prediction_type" in asyncio.run(call_sync())
+    
+    def test_get_ml_tool_is_shared(self):
+        """Test the convenience accessor reuses one tool instance."""
+        from src.tools import get_ml_tool
+        assert get_ml_tool() is get_ml_tool()
 
 
 class TestRiskToolMLIntegration:
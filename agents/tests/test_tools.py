@@ -2,8 +2,12 @@
 Tests for MCP Tool wrappers.
 """
 
+import asyncio
+import json
+import httpx
 import pytest
-from src.tools import SchemaTool, KPITool, SQLTool
+import pandas as pd
+from src.tools import SchemaTool, KPITool, SQLTool, CSVTool, LocalDataAdapter, MCPClient
 
 
 class TestSchemaTool:
@@ -39,6 +43,36 @@ class TestSchemaTool:
         assert "Available Schema" in result
         assert "orders" in result.lower()
 
+    @pytest.mark.asyncio
+    async def test_server_schema_is_cached(self, schema_tool, monkeypatch):
+        """Test a server schema is fetched once per table until it expires."""
+        from src.tools import schema_tool as schema_module
+        from src.tools.mcp_client import MCPResponse
+
+        calls = []
+
+        class FakeClient:
+            async def call(self, method, params=None):
+                calls.append(params)
+                return MCPResponse(
+                    success=True,
+                    data={"tables": [{"name": "orders", "columns": [{"name": "order_id", "type": "string"}]}]},
+                )
+
+        monkeypatch.setattr(schema_module, "get_mcp_client", lambda: FakeClient())
+        monkeypatch.setattr(schema_module, "_schema_cache", schema_module.OrderedDict())
+
+        first = await schema_tool._arun(table_name="orders")
+        assert "order_id" in first
+        assert await schema_tool._arun(table_name="orders") == first
+        assert len(calls) == 1
+
+        monkeypatch.setattr(schema_module, "_SCHEMA_CACHE_TTL", 0.0)
+        schema_module._schema_cache.clear()
+        await schema_tool._arun(table_name="orders")
+        await schema_tool._arun(table_name="orders")
+        assert len(calls) == 3
+
 
 class TestKPITool:
     """Test cases for KPI tool."""
@@ -75,6 +109,56 @@ class TestKPITool:
         assert "approval_rate" in result.lower()
         assert "2025-12-01" in result
     
+    @pytest.mark.asyncio
+    async def test_identical_calls_share_one_mcp_call(self, kpi_tool, monkeypatch):
+        """Test repeated/concurrent identical KPI requests hit MCP once."""
+        from src.tools import kpi_tool as kpi_module
+        from src.tools.mcp_client import MCPResponse
+        
+        calls = []
+        
+        class FakeClient:
+            async def call(self, method, params=None):
+                calls.append(method)
+                await asyncio.sleep(0)
+                return MCPResponse(success=True, data={"value": 42.0})
+        
+        monkeypatch.setattr(kpi_module, "get_mcp_client", lambda: FakeClient())
+        monkeypatch.setattr(kpi_module, "_kpi_cache", kpi_module.OrderedDict())
+        
+        kwargs = {"kpi_name": "gmv", "start_date": "2025-12-01", "end_date": "2025-12-31"}
+        results = await asyncio.gather(kpi_tool._arun(**kwargs), kpi_tool._arun(**kwargs))
+        results.append(await kpi_tool._arun(**kwargs))
+        
+        assert calls == ["kpi.get"]
+        assert all("42.00" in r for r in results)
+        
+        monkeypatch.setattr(kpi_module, "_KPI_CACHE_TTL", 0.0)
+        kpi_module._kpi_cache.clear()
+        await kpi_tool._arun(**kwargs)
+        await kpi_tool._arun(**kwargs)
+        assert calls == ["kpi.get"] * 3
+    
+    @pytest.mark.asyncio
+    async def test_unserializable_filters_skip_the_cache(self, kpi_tool, monkeypatch):
+        """Test filters that can't be cache keys still reach MCP and its fallback."""
+        from src.tools import kpi_tool as kpi_module
+        from src.tools.mcp_client import MCPResponse
+        
+        calls = []
+        
+        class FakeClient:
+            async def call(self, method, params=None):
+                calls.append(method)
+                return MCPResponse(success=False, error="Object of type set is not JSON serializable")
+        
+        monkeypatch.setattr(kpi_module, "get_mcp_client", lambda: FakeClient())
+        
+        result = await kpi_tool._arun(kpi_name="gmv", filters={"merchant_id": {"M1", "M2"}})
+        
+        assert calls == ["kpi.get"]
+        assert isinstance(result, str)
+    
     def test_list_kpis(self):
         """Test listing all available KPIs."""
         result = KPITool.list_kpis()
@@ -84,6 +168,109 @@ class TestKPITool:
         assert "dispute_rate" in result.lower()
 
 
+class TestMCPClient:
+    """Test cases for the MCP client."""
+    
+    @staticmethod
+    def client_for(handler):
+        client = MCPClient()
+        client._clients[asyncio.get_running_loop()] = httpx.AsyncClient(
+            base_url="http://mcp", transport=httpx.MockTransport(handler)
+        )
+        return client
+    
+    @pytest.mark.asyncio
+    async def test_call_many_matches_responses_by_id(self):
+        """Test a batch is sent once and answered in request order."""
+        posts = []
+        
+        def handler(request):
+            batch = json.loads(request.content)
+            posts.append(batch)
+            # Answer out of order
+            return httpx.Response(200, json=[
+                {"jsonrpc": "2.0", "id": r["id"], "result": r["method"]} for r in reversed(batch)
+            ])
+        
+        responses = await self.client_for(handler).call_many([("kpi.get", {"kpi_name": "gmv"}), ("schema.get", None)])
+        
+        assert len(posts) == 1
+        assert [r.data for r in responses] == ["kpi.get", "schema.get"]
+    
+    @pytest.mark.asyncio
+    async def test_call_many_falls_back_without_batch_support(self):
+        """Test servers rejecting batches get one call per request."""
+        def handler(request):
+            body = json.loads(request.content)
+            if isinstance(body, list):
+                return httpx.Response(200, json={"jsonrpc": "2.0", "id": None, "error": {"code": -32600, "message": "Invalid Request"}})
+            return httpx.Response(200, json={"jsonrpc": "2.0", "id": body["id"], "result": body["method"]})
+        
+        responses = await self.client_for(handler).call_many([("a", None), ("b", None)])
+        
+        assert [r.data for r in responses] == ["a", "b"]
+    
+    def test_call_sync_without_event_loop(self):
+        """Test the blocking call path shares the response handling of call()."""
+        def handler(request):
+            body = json.loads(request.content)
+            if body["method"] == "missing":
+                return httpx.Response(404)
+            return httpx.Response(200, json={"jsonrpc": "2.0", "id": body["id"], "result": body["params"]})
+        
+        client = MCPClient()
+        client._sync_client = httpx.Client(base_url="http://mcp", transport=httpx.MockTransport(handler))
+        
+        assert client.call_sync("risk.score", {"id": "U1"}).data == {"id": "U1"}
+        response = client.call_sync("missing")
+        assert not response.success
+        assert response.metadata["status_code"] == 404
+    
+    def test_sync_calls_share_one_client(self):
+        """Test sync tool calls run on one background loop and reuse its client."""
+        from src.tools._loop import run_sync
+        
+        client = MCPClient()
+        
+        async def get_client():
+            return await client._get_client()
+        
+        assert run_sync(get_client()) is run_sync(get_client())
+    
+    def test_run_tools_keeps_argument_order(self):
+        """Test concurrent tool calls come back in the order they were given."""
+        from src.tools import run_tools_sync
+        
+        async def reply(value, delay):
+            await asyncio.sleep(delay)
+            return value
+        
+        assert run_tools_sync(reply("schema", 0.02), reply("risk", 0)) == ["schema", "risk"]
+    
+    @pytest.mark.asyncio
+    async def test_resilient_call_retries_transient_errors(self):
+        """Test 503s are retried while other HTTP errors return at once."""
+        from src.tools import resilient_call
+        
+        statuses = {"flaky": [503, 503, 200], "missing": [404, 200]}
+        seen = []
+        
+        def handler(request):
+            body = json.loads(request.content)
+            seen.append(body["method"])
+            status = statuses[body["method"]].pop(0)
+            if status != 200:
+                return httpx.Response(status)
+            return httpx.Response(200, json={"jsonrpc": "2.0", "id": body["id"], "result": "ok"})
+        
+        client = self.client_for(handler)
+        
+        assert (await resilient_call(client, "flaky", base_delay=0)).data == "ok"
+        response = await resilient_call(client, "missing", base_delay=0)
+        assert response.metadata["status_code"] == 404
+        assert seen == ["flaky"] * 3 + ["missing"]
+
+
 class TestSQLTool:
     """Test cases for SQL tool."""
     
@@ -128,3 +315,244 @@ class TestSQLTool:
         )
         
         assert "Validation Failed" in result or "not in the allowlist" in result
+    
+    @pytest.mark.asyncio
+    async def test_allowlist_sees_through_qualifiers_and_ctes(self, sql_tool):
+        """Test foreign schemas and CTE names shadowing a real table are rejected."""
+        queries = {
+            "SELECT * FROM information_schema.users WHERE created_at >= '2025-12-01'": "information_schema",
+            "SELECT * FROM other_db.orders WHERE created_at >= '2025-12-01'": "other_db",
+            "SELECT * FROM secret_table WHERE created_at >= '2025-12-01' AND id IN "
+            "(WITH secret_table AS (SELECT 1 AS id) SELECT id FROM secret_table)": "secret_table",
+        }
+        for query, table in queries.items():
+            result = await sql_tool._arun(query=query)
+            assert f"Table '{table}' is not in the allowlist" in result
+
+
+class TestTraceTool:
+    """Test cases for the trace tool."""
+    
+    def test_traces_are_batched_in_background(self, monkeypatch):
+        """Test traces are queued and sent to MCP together in one batch."""
+        from src.tools import TraceTool
+        from src.tools import trace_tool as trace_module
+        from src.tools.mcp_client import MCPResponse
+        
+        batches = []
+        
+        class FakeClient:
+            async def call_many(self, requests):
+                batches.append([params["event_type"] for _, params in requests])
+                return [MCPResponse(success=True) for _ in requests]
+        
+        monkeypatch.setattr(trace_module, "get_mcp_client", lambda: FakeClient())
+        monkeypatch.setattr(trace_module, "_TRACE_BATCH_MAX_WAIT", 60)
+        
+        tool = TraceTool()
+        results = [tool._run(event_type=e) for e in ("query_start", "tool_call", "query_complete")]
+        
+        assert results[0] == "Trace queued: query_start"
+        assert batches == []
+        trace_module._drain_pending()
+        assert batches == [["query_start", "tool_call", "query_complete"]]
+    
+    def test_sampled_out_traces_keep_errors(self, monkeypatch):
+        """Test sampling and dropped event types never skip errors."""
+        from src.tools import TraceTool
+        from src.tools import trace_tool as trace_module
+        
+        monkeypatch.setattr(trace_module, "_SAMPLE_RATE", 0.0)
+        monkeypatch.setattr(trace_module, "_DROP_EVENTS", frozenset({"tool_call"}))
+        monkeypatch.setattr(trace_module, "_queue_trace", lambda payload: None)
+        
+        tool = TraceTool()
+        
+        assert tool._run(event_type="tool_call") == "Trace skipped: tool_call"
+        assert tool._run(event_type="query_complete") == "Trace skipped: query_complete"
+        assert tool._run(event_type="error", error="boom") == "Trace queued: error"
+
+
+class TestCSVTool:
+    """Test cases for CSV tool."""
+    
+    @pytest.fixture
+    def csv_tool(self):
+        return CSVTool()
+    
+    def test_comparison_filters(self, csv_tool):
+        """Test chained comparison filters."""
+        result = csv_tool._run({
+            "table": "orders",
+            "filters": [
+                {"col": "status", "op": "==", "val": "approved"},
+                {"col": "amount", "op": ">", "val": 1000},
+            ],
+            "columns": ["order_id", "amount", "status"],
+            "limit": 5,
+        })
+        
+        assert result.startswith("Found 5 rows")
+        assert "rejected" not in result
+    
+    def test_contains_and_in_filters(self, csv_tool):
+        """Test substring and membership filters."""
+        result = csv_tool._run({
+            "table": "users",
+            "filters": [
+                {"col": "city", "op": "contains", "val": "casa"},
+                {"col": "account_status", "op": "in", "val": ["active"]},
+            ],
+            "columns": ["user_id", "city", "account_status"],
+        })
+        
+        assert "Casablanca" in result
+        assert "blocked" not in result
+    
+    def test_fused_numeric_filters(self, csv_tool):
+        """Test 3+ numeric filters give the same rows as one at a time."""
+        filters = [
+            {"col": "late_days", "op": ">", "val": 5},
+            {"col": "late_days", "op": "<=", "val": 30},
+            {"col": "installment_number", "op": "==", "val": 2},
+        ]
+        query = {"table": "installments", "columns": ["installment_id"], "limit": 100_000}
+        
+        fused = csv_tool._run({**query, "filters": filters})
+        
+        narrowed = csv_tool._run({**query, "filters": filters[:2]})
+        expected = csv_tool._run({**query, "filters": filters[2:]})
+        rows = set(narrowed.splitlines()[4:]) & set(expected.splitlines()[4:])
+        
+        assert set(fused.splitlines()[4:]) == rows
+    
+    def test_arrow_output_round_trip(self, csv_tool):
+        """Test arrow_b64 output decodes with dtypes intact."""
+        pytest.importorskip("pyarrow")
+        from src.tools.csv_tool import read_arrow_b64
+        
+        payload = csv_tool._run({
+            "table": "installments",
+            "columns": ["installment_id", "late_days"],
+            "limit": 10,
+            "format": "arrow_b64",
+        })
+        df = read_arrow_b64(payload)
+        
+        assert list(df.columns) == ["installment_id", "late_days"]
+        assert len(df) == 10
+        assert df["late_days"].dtype == "float64"
+
+
+class TestLocalDataAdapter:
+    """Test cases for the local CSV data adapter."""
+    
+    @pytest.fixture
+    def adapter(self, tmp_path):
+        orders = pd.DataFrame({
+            "order_id": ["O1", "O2", "O3", "O4", "O5"],
+            "user_id": ["U1", "U2", "U1", "U3", "U2"],
+            "merchant_id": ["M1", "M1", "M2", "M2", "M1"],
+            "amount": [100, 200, 300, 400, 500],
+            "status": ["approved", "rejected", "approved", "approved", "approved"],
+            "created_at": ["2025-12-20", "2025-11-02", None, "2025-12-01", "2025-11-15"],
+        })
+        orders.to_csv(tmp_path / "orders.csv", index=False)
+        return LocalDataAdapter(str(tmp_path))
+    
+    def test_gmv_date_window(self, adapter):
+        """Test GMV only counts approved orders inside the window."""
+        assert adapter.calculate_gmv()["value"] == 1300
+        
+        result = adapter.calculate_gmv("2025-11-15", "2025-12-01")
+        assert result["value"] == 900
+        assert result["order_count"] == 2
+    
+    def test_undated_rows_excluded_from_windows(self, adapter):
+        """Test rows without a date never match a date range."""
+        assert adapter.calculate_gmv(start_date="2025-01-01")["value"] == 1000
+        assert adapter.calculate_approval_rate(end_date="2025-12-31")["total"] == 4
+    
+    def test_metrics_bundle_matches_individual_kpis(self, adapter):
+        """Test the one-pass bundle agrees with the per-KPI methods."""
+        window = ("2025-11-01", "2025-12-15")
+        bundle = adapter.calculate_metrics_bundle(*window)
+        
+        assert bundle["gmv"] == adapter.calculate_gmv(*window)
+        assert bundle["approval_rate"] == adapter.calculate_approval_rate(*window)
+        assert bundle["active_users"] == adapter.calculate_active_users(*window)
+    
+    def test_unparsed_dates_still_filter(self, tmp_path):
+        """Test date columns left as text are still windowed, by string comparison."""
+        pd.DataFrame({
+            "order_id": ["O1", "O2", "O3", "O4"],
+            "user_id": ["U1", "U2", "U1", "U3"],
+            "amount": [100, 200, 300, 400],
+            "status": ["approved", "approved", "approved", "rejected"],
+            "created_at": ["2025-12-20", "not a date", "2025-11-02", "2025-12-05"],
+        }).to_csv(tmp_path / "orders.csv", index=False)
+        pd.DataFrame({
+            "user_id": ["U1", "U2", "U1"],
+            "status": ["late", "paid", "late"],
+            "due_date": ["2025-12-20", "someday", "2025-11-02"],
+        }).to_csv(tmp_path / "installments.csv", index=False)
+        adapter = LocalDataAdapter(str(tmp_path))
+        window = ("2025-12-01", "2025-12-31")
+        
+        assert adapter.calculate_gmv(*window) == {"value": 100.0, "order_count": 1}
+        assert adapter.calculate_approval_rate(*window)["total"] == 2
+        assert adapter.calculate_late_rate(*window)["total"] == 1
+    
+    def test_key_columns_share_categories(self, adapter, tmp_path):
+        """Test id columns load as categoricals that survive the merchant join."""
+        pd.DataFrame({
+            "merchant_id": ["M2", "M1", "M3"],
+            "merchant_name": ["Two", "One", "Three"],
+        }).to_csv(tmp_path / "merchants.csv", index=False)
+        adapter = LocalDataAdapter(str(tmp_path))
+        
+        loaded = adapter.get_table("orders")
+        merchants = adapter.get_table("merchants")
+        # Recoding publishes a new orders frame; the one handed out is untouched
+        orders = adapter.get_table("orders")
+        assert list(loaded["merchant_id"].cat.categories) == ["M1", "M2"]
+        assert isinstance(orders["merchant_id"].dtype, pd.CategoricalDtype)
+        assert orders["merchant_id"].dtype == merchants["merchant_id"].dtype
+        
+        top = adapter.get_top_merchants("gmv", 2)
+        assert top["merchant_name"].tolist() == ["Two", "One"]
+        assert top["gmv"].tolist() == [700, 600]
+    
+    def test_tables_load_on_first_access(self, adapter):
+        """Test tables are discovered up front but only read when used."""
+        assert adapter.tables == ["orders"]
+        assert adapter._dataframes == {}
+        
+        assert len(adapter.get_table("orders")) == 5
+        assert list(adapter._dataframes) == ["orders"]
+        assert adapter.get_table("missing") is None
+    
+    def test_user_rows_lookup(self, adapter):
+        """Test per-user row positions match a scan of the user_id column."""
+        orders = adapter.get_table("orders")
+        rows = adapter.get_user_rows("orders", "U1")
+        assert sorted(orders["order_id"].take(rows)) == ["O1", "O3"]
+        assert len(adapter.get_user_rows("orders", "U9")) == 0
+        assert adapter.get_user_rows("missing", "U1") is None
+    
+    def test_count_statuses(self, adapter):
+        """Test status counts over a user's rows."""
+        rows = adapter.get_user_rows("orders", "U2")
+        assert adapter.count_statuses("orders", rows) == {"approved": 1, "rejected": 1}
+    
+    def test_unfiltered_query_leaves_cache_untouched(self, adapter):
+        """Test mutating an unfiltered query result never changes the cached table."""
+        amounts = adapter.get_table("orders")["amount"].tolist()
+        for result in (adapter.query("orders"), adapter.query("orders", missing_col=5)):
+            assert result is not adapter.get_table("orders")
+            result["poison"] = 1
+            result["amount"] = -1
+        
+        orders = adapter.get_table("orders")
+        assert "poison" not in orders.columns
+        assert orders["amount"].tolist() == amounts
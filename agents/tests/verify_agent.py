@@ -64,13 +64,13 @@ async def test_kpi_tool():
     
     kpi_tool = KPITool()
     
-    # Test GMV
-    result = await kpi_tool._arun(kpi_name="gmv")
-    print(f"GMV Result:\n{result}\n")
-    
-    # Test Approval Rate
-    result = await kpi_tool._arun(kpi_name="approval_rate")
-    print(f"Approval Rate Result:\n{result}\n")
+    # Test GMV and Approval Rate (fetched concurrently)
+    gmv, approval_rate = await asyncio.gather(
+        kpi_tool._arun(kpi_name="gmv"),
+        kpi_tool._arun(kpi_name="approval_rate"),
+    )
+    print(f"GMV Result:\n{gmv}\n")
+    print(f"Approval Rate Result:\n{approval_rate}\n")
     
     print()
 
@@ -100,44 +100,41 @@ async def test_ml_predictions():
     
     ml_tool = MLPredictionTool()
     
-    # Test Trust Score prediction (UC2)
+    # Test Trust Score prediction (UC2) for a good and a risky customer;
+    # run concurrently, so both rows are scored in one model call
     print("Testing UC2 Trust Score Model...")
-    result = await ml_tool._arun(
-        prediction_type="trust_score",
-        features={
-            "account_age_days": 120,
-            "kyc_level_num": 2,
-            "account_status_num": 1,
-            "late_rate_90d": 0.1,
-            "ontime_rate_90d": 0.9,
-            "active_plans": 1,
-            "orders_30d": 5,
-            "amount_30d": 1200,
-            "disputes_90d": 0,
-            "refunds_90d": 0,
-            "checkout_abandon_rate_30d": 0.15,
-        }
+    good_customer = {
+        "account_age_days": 120,
+        "kyc_level_num": 2,
+        "account_status_num": 1,
+        "late_rate_90d": 0.1,
+        "ontime_rate_90d": 0.9,
+        "active_plans": 1,
+        "orders_30d": 5,
+        "amount_30d": 1200,
+        "disputes_90d": 0,
+        "refunds_90d": 0,
+        "checkout_abandon_rate_30d": 0.15,
+    }
+    risky_customer = {
+        "account_age_days": 30,
+        "kyc_level_num": 1,
+        "account_status_num": 1,
+        "late_rate_90d": 0.5,
+        "ontime_rate_90d": 0.5,
+        "active_plans": 3,
+        "orders_30d": 8,
+        "amount_30d": 3000,
+        "disputes_90d": 2,
+        "refunds_90d": 1,
+        "checkout_abandon_rate_30d": 0.6,
+    }
+    good_result, risky_result = await asyncio.gather(
+        ml_tool._arun(prediction_type="trust_score", features=good_customer),
+        ml_tool._arun(prediction_type="trust_score", features=risky_customer),
     )
-    print(f"Trust Score Result (Good Customer):\n{result}\n")
-    
-    # Test with risky customer
-    result = await ml_tool._arun(
-        prediction_type="trust_score",
-        features={
-            "account_age_days": 30,
-            "kyc_level_num": 1,
-            "account_status_num": 1,
-            "late_rate_90d": 0.5,
-            "ontime_rate_90d": 0.5,
-            "active_plans": 3,
-            "orders_30d": 8,
-            "amount_30d": 3000,
-            "disputes_90d": 2,
-            "refunds_90d": 1,
-            "checkout_abandon_rate_30d": 0.6,
-        }
-    )
-    print(f"Trust Score Result (Risky Customer):\n{result}\n")
+    print(f"Trust Score Result (Good Customer):\n{good_result}\n")
+    print(f"Trust Score Result (Risky Customer):\n{risky_result}\n")
     
     print()
 
@@ -150,11 +147,12 @@ async def test_risk_tool_with_ml():
     
     risk_tool = RiskTool()
     
-    result = await risk_tool._arun(entity_type="user", entity_id="U12345")
-    print(f"Risk Score for U12345:\n{result}\n")
-    
-    result = await risk_tool._arun(entity_type="user", entity_id="U99999")
-    print(f"Risk Score for U99999:\n{result}\n")
+    user_ids = ["U12345", "U99999"]
+    results = await asyncio.gather(
+        *(risk_tool._arun(entity_type="user", entity_id=user_id) for user_id in user_ids)
+    )
+    for user_id, result in zip(user_ids, results):
+        print(f"Risk Score for {user_id}:\n{result}\n")
     
     print()
 
@@ -170,14 +168,18 @@ async def test_full_agent_query():
         "How many active users do we have?",
     ]
     
-    for query in queries:
+    # Queries run concurrently; answers are printed in query order
+    responses = await asyncio.gather(
+        *(run_query(query) for query in queries), return_exceptions=True
+    )
+    
+    for query, response in zip(queries, responses):
         print(f"\nQuery: {query}")
         print("-" * 40)
-        try:
-            response = await run_query(query)
+        if isinstance(response, Exception):
+            print(f"Error: {response}")
+        else:
             print(response)
-        except Exception as e:
-            print(f"Error: {e}")
     
     print()
 
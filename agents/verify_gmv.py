@@ -6,9 +6,13 @@ Run this to compare agent output vs direct pandas calculation.
 import pandas as pd
 from pathlib import Path
 
-# Load orders data
+# Load orders data - only the two columns the checks use
 data_path = Path(__file__).parent.parent / "data" / "silver"
-orders = pd.read_csv(data_path / "orders.csv")
+orders = pd.read_csv(
+    data_path / "orders.csv",
+    usecols=["status", "amount"],
+    dtype={"status": "category"},
+)
 
 print("=" * 60)
 print("GMV VERIFICATION")
@@ -0,0 +1,36 @@
+import pandas as pd
+from pathlib import Path
+
+# --------------------
+# PATHS
+# --------------------
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+SILVER_PATH = PROJECT_ROOT / "data" / "silver"
+
+# Same date columns the agent's LocalDataAdapter parses
+DATE_COLUMNS = ["created_at", "due_date", "paid_date"]
+
+
+def convert_table(csv_path: Path) -> Path:
+    header = pd.read_csv(csv_path, nrows=0).columns
+    date_cols = [c for c in DATE_COLUMNS if c in header]
+    df = pd.read_csv(csv_path, parse_dates=date_cols, date_format="ISO8601")
+
+    # Sorted dates give tight per-row-group min/max stats for range reads
+    if "created_at" in date_cols:
+        df = df.sort_values("created_at", kind="stable", na_position="first")
+
+    parquet_path = csv_path.with_suffix(".parquet")
+    df.to_parquet(parquet_path, index=False)
+    return parquet_path
+
+
+def main():
+    for csv_path in sorted(SILVER_PATH.glob("*.csv")):
+        parquet_path = convert_table(csv_path)
+        print(f"✅ Silver table converted: {parquet_path}")
+
+
+if __name__ == "__main__":
+    main()
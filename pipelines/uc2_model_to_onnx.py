@@ -0,0 +1,39 @@
+import joblib
+from pathlib import Path
+from skl2onnx import convert_sklearn
+from skl2onnx.common.data_types import FloatTensorType
+
+# --------------------
+# PATHS
+# --------------------
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+UC2_MODEL_PATH = PROJECT_ROOT / "ML" / "to_test_agent" / "uc2_Risk_Score" / "model" / "rf_bnpl_v1.joblib"
+
+# The agent loads this file instead of the joblib model when onnxruntime
+# is installed (see agents/src/tools/ml_tool.py)
+UC2_ONNX_PATH = UC2_MODEL_PATH.with_suffix(".onnx")
+
+
+def convert_model(model_path: Path, onnx_path: Path) -> Path:
+    artifact = joblib.load(model_path)
+    model = artifact["model"]
+    features = artifact["features"]
+
+    # Plain probability tensor output (no list of dicts) for batch scoring
+    onnx_model = convert_sklearn(
+        model,
+        initial_types=[("X", FloatTensorType([None, len(features)]))],
+        options={id(model): {"zipmap": False}},
+    )
+    onnx_path.write_bytes(onnx_model.SerializeToString())
+    return onnx_path
+
+
+def main():
+    onnx_path = convert_model(UC2_MODEL_PATH, UC2_ONNX_PATH)
+    print(f"✅ UC2 model exported to ONNX: {onnx_path}")
+
+
+if __name__ == "__main__":
+    main()
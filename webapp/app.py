@@ -35,7 +35,7 @@ load_dotenv(AGENTS_PATH / ".env")
 
 # Import agent components
 from src.tools.local_data import get_local_data
-from src.tools import MLPredictionTool, RiskTool, KPITool
+from src.tools import RiskTool, KPITool, get_ml_tool
 from src.graph import run_query
 
 # Page config
@@ -387,7 +387,7 @@ def get_ml_prediction(query: str) -> dict:
         result["type"] = "late_payment"
     
     if result["requires_ml"]:
-        ml_tool = MLPredictionTool()
+        ml_tool = get_ml_tool()
         
         # Sample features for demo (in production, extract from query or database)
         if result["type"] == "trust_score":
@@ -405,7 +405,7 @@ def get_ml_prediction(query: str) -> dict:
                 "checkout_abandon_rate_30d": 0.15,
             }
             
-            prediction = asyncio.run(ml_tool._arun("trust_score", features))
+            prediction = ml_tool._run("trust_score", features)
             result["prediction"] = prediction
         
         elif result["type"] == "late_payment":
@@ -418,7 +418,7 @@ def get_ml_prediction(query: str) -> dict:
                 "kyc_level_num": 2,
             }
             
-            prediction = asyncio.run(ml_tool._arun("late_payment", features))
+            prediction = ml_tool._run("late_payment", features)
             result["prediction"] = prediction
     
     return result
@@ -581,7 +581,7 @@ def render_risk_assessment():
         
         if st.button("🔮 Calculate Trust Score", key="trust_btn"):
             with st.spinner("Running ML Model..."):
-                ml_tool = MLPredictionTool()
+                ml_tool = get_ml_tool()
                 features = {
                     "account_age_days": account_age,
                     "kyc_level_num": kyc_level,
@@ -596,7 +596,7 @@ def render_risk_assessment():
                     "checkout_abandon_rate_30d": abandon_rate,
                 }
                 
-                result = asyncio.run(ml_tool._arun("trust_score", features))
+                result = ml_tool._run("trust_score", features)
                 
                 st.markdown("### Result")
                 st.markdown(result)
@@ -643,7 +643,7 @@ def render_risk_assessment():
         
         if st.button("🔮 Predict Late Payment Risk", key="late_btn"):
             with st.spinner("Running ML Model..."):
-                ml_tool = MLPredictionTool()
+                ml_tool = get_ml_tool()
                 features = {
                     "late_payment_rate_90d": lp_late_rate,
                     "avg_late_days_90d": lp_avg_late,
@@ -653,7 +653,7 @@ def render_risk_assessment():
                     "kyc_level_num": lp_kyc,
                 }
                 
-                result = asyncio.run(ml_tool._arun("late_payment", features))
+                result = ml_tool._run("late_payment", features)
                 
                 st.markdown("### Prediction Result")
                 st.markdown(result)